@@ -1,6 +1,19 @@
 # app/main.py
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
+from .pdf_parser import shutdown_pdf_pool
+from .service.crud_ingest_jobs import start_ingest_workers
+from .service.crud_ai_diet_exercise import PLAN_CACHE
+from .service.crud_media_catalog import load_media_catalog
+from .service.action_dispatcher import close_action_client
+from .utils.ai_agent import (
+    start_http_client, close_http_client, FOOD_IMAGE_CACHE, LLM_CACHE, MEDICINE_REASON_CACHE,
+    food_catalog_key, exercise_catalog_key
+)
+from .utils.chat_client import start_chat_client, close_chat_client
+
 from .routes import (
     careplan,
     appointments,
@@ -11,7 +24,29 @@ from .routes import (
     chat
 )
 
-app = FastAPI(title="GPP CarePlan Parser")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_http_client()
+    await start_chat_client()
+    await FOOD_IMAGE_CACHE.ensure_indexes()
+    await LLM_CACHE.ensure_indexes()
+    await MEDICINE_REASON_CACHE.ensure_indexes()
+    await PLAN_CACHE.ensure_indexes()
+    catalog = await load_media_catalog({"food": food_catalog_key, "exercise": exercise_catalog_key})
+    print(f"[media_catalog] loaded {catalog}")
+    workers = start_ingest_workers()
+    yield
+    for task in workers:
+        task.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    await close_http_client()
+    await close_chat_client()
+    await close_action_client()
+    shutdown_pdf_pool()
+
+
+app = FastAPI(title="GPP CarePlan Parser", lifespan=lifespan)
 
 # Routers with prefixes + tags for Swagger
 app.include_router(careplan.router, prefix="/api/careplans", tags=["CarePlans"])
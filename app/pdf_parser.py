@@ -1,29 +1,87 @@
 # app/pdf_parser.py
+import multiprocessing
+import os
 import pdfplumber
 import re
+import shutil
+import tempfile
+import threading
+import time
 import uuid
-from typing import List
-from app.models import CarePlanCreate, Medication, Appointment, MedicationSchedule
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import TypeAdapter
+from app.models import CarePlanCreate, Medication, Appointment
+from app.utils.section_index import SectionIndexer, SectionIndex, line_heading
+
+# Page-parallel extraction: documents with at least PDF_PARALLEL_MIN_PAGES pages
+# are spread over PDF_PARSE_WORKERS processes (1 disables the pool).
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "8"))
+# Workers are started from a clean server process, never forked from the
+# running app (a fork would copy its event loop, threads and Mongo/HTTP
+# clients); "spawn" where forkserver is not available
+PDF_POOL_START_METHOD = os.getenv(
+    "PDF_POOL_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn",
+)
+# "parallel" reads every page; "lazy" stops once all sections are found
+PDF_EXTRACT_MODE = os.getenv("PDF_EXTRACT_MODE", "parallel").lower()
+
+_PDF_POOL: Optional[ProcessPoolExecutor] = None
+_PDF_POOL_LOCK = threading.Lock()
+
+CAREPLAN_HEADINGS = ["Medications", "Appointments", "Notes", "Care Plan", "Medical History"]
+
+# Compiled once at import; one finditer pass yields every section of an upload
+CAREPLAN_SECTIONS = SectionIndexer({h.lower(): line_heading(h) for h in CAREPLAN_HEADINGS})
+# Sections parse_pdf reads; lazy scanning stops once all of them are closed
+REQUIRED_SECTIONS = ("medications", "appointments", "medical history")
+
+
+@lru_cache(maxsize=32)
+def _indexer_for(headings: Tuple[str, ...]) -> SectionIndexer:
+    return SectionIndexer({h: line_heading(h) for h in headings})
+
+
+def index_sections(full_text: str) -> SectionIndex:
+    """Index all known care plan headings of `full_text` in a single scan."""
+    return CAREPLAN_SECTIONS.index(full_text)
 
-_HEADING_MATCH_FLAGS = re.IGNORECASE | re.MULTILINE
 
 def _find_section(full_text: str, heading: str, next_headings: List[str]) -> str:
     if not full_text:
         return ""
-    pattern = re.compile(rf"^\s*{re.escape(heading)}\s*:?\s*$", _HEADING_MATCH_FLAGS)
-    m = pattern.search(full_text)
-    if not m:
-        return ""
-    start = m.end()
-    end = len(full_text)
-    for nh in next_headings:
-        if nh.lower() == heading.lower():
-            continue
-        p = re.compile(rf"^\s*{re.escape(nh)}\s*:?\s*$", _HEADING_MATCH_FLAGS)
-        mm = p.search(full_text, start)
-        if mm and mm.start() < end:
-            end = mm.start()
-    return full_text[start:end].strip()
+    key = heading.lower()
+    stops = tuple(dict.fromkeys(h.lower() for h in next_headings if h.lower() != key))
+    if key in CAREPLAN_SECTIONS.keys and all(h in CAREPLAN_SECTIONS.keys for h in stops):
+        indexer = CAREPLAN_SECTIONS
+    else:
+        indexer = _indexer_for((key,) + stops)
+    return indexer.index(full_text).section(key, until=stops)
+
+
+_BULLET_START = re.compile(r'^[-•\*\u2022]\s+|^\d+\.\s+')
+_BULLET_PREFIX = re.compile(r'^\s*[-•\*\u2022]?\s*\d*\.?\s*[:\-–—\s]*')
+
+# All medication fields in one alternation, so a block is scanned once.
+# Only the "Label:" part is consumed; values are captured in a lookahead so
+# a label that appears inside another field's value is still found. The
+# leading class lets the engine skip positions no label can start at.
+_MED_FIELDS = re.compile(
+    r'(?=[dfmntw])(?:'
+    r'(?:Medicine|Medication|Name)\s*[:\-]\s*(?=(?P<name>.+))'
+    r'|Dose\s*[:\-]\s*(?=(?P<dose>[^\n]+))'
+    r'|(?:Time|When to take|Timing|Frequency)\s*[:\-]\s*(?=(?P<timing>[^\n]+))'
+    r'|(?:Duration|For how long|Days|Weeks|Months)\s*[:\-]\s*(?=(?P<duration>[^\n]+)))',
+    re.IGNORECASE
+)
+_NAME_LABEL = re.compile(r'^(?:Medicine|Medication|Name)\s*[:\-]?\s*', re.IGNORECASE)
+_DOSE_WORD = re.compile(r'\bDose\b|\bDose:\b', re.IGNORECASE)
+_TIMING_SEP = re.compile(r'[;,/]+')
+
+_MEDICATION_LIST = TypeAdapter(List[Medication])
 
 
 def _split_to_blocks(section_text: str) -> List[str]:
@@ -32,6 +90,7 @@ def _split_to_blocks(section_text: str) -> List[str]:
     lines = section_text.splitlines()
     blocks: List[List[str]] = []
     current: List[str] = []
+    bullet = _BULLET_START.match
 
     for ln in lines:
         s = ln.strip()
@@ -40,7 +99,7 @@ def _split_to_blocks(section_text: str) -> List[str]:
                 blocks.append(current)
                 current = []
             continue
-        if re.match(r'^[-•\*\u2022]\s+|^\d+\.\s+', s):
+        if bullet(s):
             if current:
                 blocks.append(current)
             current = [s]
@@ -55,60 +114,63 @@ def _split_to_blocks(section_text: str) -> List[str]:
 
 
 def _clean_bullet_prefix(text: str) -> str:
-    return re.sub(r'^\s*[-•\*\u2022]?\s*\d*\.?\s*[:\-–—\s]*', '', text).strip()
+    return _BULLET_PREFIX.sub('', text, count=1).strip()
+
+
+def _scan_medication_fields(blk_norm: str) -> Dict[str, str]:
+    """First value of each medication field in the block, from one scan."""
+    found: Dict[str, str] = {}
+    for m in _MED_FIELDS.finditer(blk_norm):
+        field = m.lastgroup
+        if field not in found:
+            found[field] = m.group(field)
+            if len(found) == 4:
+                break
+    return found
+
+
+def _new_ids(count: int) -> List[str]:
+    """`count` random (version 4) UUID strings from a single urandom call."""
+    raw = os.urandom(16 * count)
+    return [str(uuid.UUID(bytes=raw[i:i + 16], version=4)) for i in range(0, 16 * count, 16)]
 
 
 def parse_medications_section(text: str) -> List[Medication]:
-    meds: List[Medication] = []
-    blocks = _split_to_blocks(text)
-    for blk in blocks:
+    rows: List[dict] = []
+    for blk in _split_to_blocks(text):
         blk_norm = _clean_bullet_prefix(blk.strip())
         if not blk_norm:
             continue
 
-        name = None
-        dose = None
-        schedule: List[MedicationSchedule] = []   # fixed initialization
-        duration = None
+        fields = _scan_medication_fields(blk_norm)
 
         # Extract name
-        m_name = re.search(r'(?:Medicine|Medication|Name)\s*[:\-]\s*(.+)', blk_norm, re.IGNORECASE)
-        if m_name:
-            name = m_name.group(1).strip().splitlines()[0]
+        if "name" in fields:
+            name_lines = fields["name"].strip().splitlines()
+            name = name_lines[0] if name_lines else ""
         else:
             first_line = blk_norm.splitlines()[0]
-            first_line = re.sub(r'^(?:Medicine|Medication|Name)\s*[:\-]?\s*', '', first_line, flags=re.IGNORECASE)
-            first_line = re.split(r'\bDose\b|\bDose:\b', first_line, flags=re.IGNORECASE)[0]
-            name = first_line.strip()
-
-        # Extract dose
-        d = re.search(r'Dose\s*[:\-]\s*([^\n]+)', blk_norm, re.IGNORECASE)
-        if d:
-            dose = d.group(1).strip()
-
-        # Extract timing -> now schedule
-        t = re.search(r'(?:Time|When to take|Timing|Frequency)\s*[:\-]\s*([^\n]+)', blk_norm, re.IGNORECASE)
-        if t:
-            timing_raw = t.group(1).strip()
-            timing_list = [x.strip().lower() for x in re.split(r'[;,/]+', timing_raw) if x.strip()]
-            schedule = [MedicationSchedule(time=tm, taken=None) for tm in timing_list]
+            first_line = _NAME_LABEL.sub('', first_line, count=1)
+            name = _DOSE_WORD.split(first_line, maxsplit=1)[0].strip()
+
+        dose = fields["dose"].strip() if "dose" in fields else None
+
+        # Extract timing -> schedule
+        if "timing" in fields:
+            timing_list = [x.strip().lower() for x in _TIMING_SEP.split(fields["timing"].strip()) if x.strip()]
+            schedule = [{"time": tm, "taken": None} for tm in timing_list]
         else:
             # fallback if no timing in PDF
-            schedule = [MedicationSchedule(time="unspecified", taken=None)]
+            schedule = [{"time": "unspecified", "taken": None}]
 
-        # Extract duration
-        dur = re.search(r'(?:Duration|For how long|Days|Weeks|Months)\s*[:\-]\s*([^\n]+)', blk_norm, re.IGNORECASE)
-        if dur:
-            duration = dur.group(1).strip()
+        duration = fields["duration"].strip() if "duration" in fields else None
 
-        meds.append(Medication(
-            id=str(uuid.uuid4()),
-            name=name,
-            dose=dose,
-            schedule=schedule,  # now using MedicationSchedule
-            duration=duration
-        ))
-    return meds
+        rows.append({"name": name, "dose": dose, "schedule": schedule, "duration": duration})
+
+    # build all models in one validation pass
+    for row, med_id in zip(rows, _new_ids(len(rows))):
+        row["id"] = med_id
+    return _MEDICATION_LIST.validate_python(rows)
 
 
 
@@ -130,18 +192,92 @@ def parse_appointments_section(text: str) -> List[Appointment]:
     return appts
 
 
-def parse_pdf(file_path: str, patient_id: str) -> CarePlanCreate:
-    """Parse PDF and return a CarePlanCreate object ready for Mongo insertion."""
-    pages_text = []
-    with pdfplumber.open(file_path) as pdf:
+def _extract_page_range(file_path: str, start: int, stop: int) -> List[str]:
+    """Extract text of pages [start, stop). Runs inside a pool worker, so it
+    opens its own handle on the file."""
+    with pdfplumber.open(file_path, pages=list(range(start + 1, stop + 1))) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages]
+
+
+def _get_pdf_pool() -> Optional[ProcessPoolExecutor]:
+    global _PDF_POOL
+    if PDF_PARSE_WORKERS <= 1:
+        return None
+    with _PDF_POOL_LOCK:
+        if _PDF_POOL is None:
+            _PDF_POOL = ProcessPoolExecutor(max_workers=PDF_PARSE_WORKERS,
+                                            mp_context=multiprocessing.get_context(PDF_POOL_START_METHOD))
+        return _PDF_POOL
+
+
+def shutdown_pdf_pool() -> None:
+    """Stop the page extraction workers (called from the app lifespan)."""
+    global _PDF_POOL
+    with _PDF_POOL_LOCK:
+        if _PDF_POOL is not None:
+            _PDF_POOL.shutdown(wait=True, cancel_futures=True)
+            _PDF_POOL = None
+
+
+def extract_pages_text(source) -> List[str]:
+    """Return the text of every page, in page order. `source` is a path or a
+    seekable binary stream.
+    Documents with at least PDF_PARALLEL_MIN_PAGES pages are split into
+    contiguous page ranges and extracted on the process pool; smaller ones
+    are extracted serially in the calling thread.
+    """
+    with pdfplumber.open(source) as pdf:
+        page_count = len(pdf.pages)
+        pool = _get_pdf_pool() if page_count >= PDF_PARALLEL_MIN_PAGES else None
+        if pool is None:
+            return [page.extract_text() or "" for page in pdf.pages]
+
+    if isinstance(source, (str, os.PathLike)):
+        return _extract_on_pool(pool, source, page_count)
+    # Pool workers open the document themselves, so they need a path
+    source.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp:
+        shutil.copyfileobj(source, tmp)
+        tmp.flush()
+        return _extract_on_pool(pool, tmp.name, page_count)
+
+
+def _extract_on_pool(pool: ProcessPoolExecutor, file_path: str, page_count: int) -> List[str]:
+    chunk = -(-page_count // PDF_PARSE_WORKERS)
+    ranges = [(i, min(i + chunk, page_count)) for i in range(0, page_count, chunk)]
+    futures = [pool.submit(_extract_page_range, file_path, start, stop) for start, stop in ranges]
+    pages: List[str] = []
+    for fut in futures:
+        pages.extend(fut.result())
+    return pages
+
+
+def scan_pages_lazily(source, keys: Tuple[str, ...] = REQUIRED_SECTIONS) -> Tuple[SectionIndex, Dict[str, Any]]:
+    """Extract pages one at a time, feeding each into the section index, and
+    stop opening pages once every section in `keys` has been closed by its
+    terminating heading. Returns the index and page counters."""
+    index = CAREPLAN_SECTIONS.index("")
+    pages_read = 0
+    with pdfplumber.open(source) as pdf:
+        page_count = len(pdf.pages)
         for page in pdf.pages:
-            t = page.extract_text()
-            if t:
-                pages_text.append(t)
-    full_text = "\n".join(pages_text)
-    meds_text = _find_section(full_text, "Medications", ["Appointments", "Notes", "Care Plan", "Medical History"])
-    appt_text = _find_section(full_text, "Appointments", ["Medications", "Notes", "Care Plan", "Medical History"])
-    history_text = _find_section(full_text, "Medical History", ["Medications", "Appointments", "Notes", "Care Plan"])
+            pages_read += 1
+            index.feed(page.extract_text() or "")
+            if all(index.is_closed(k) for k in keys):
+                break
+    stats = {
+        "mode": "lazy",
+        "pages_total": page_count,
+        "pages_read": pages_read,
+        "pages_skipped": page_count - pages_read,
+    }
+    return index, stats
+
+
+def _careplan_from_index(sections: SectionIndex, patient_id: str) -> CarePlanCreate:
+    meds_text = sections.section("medications")
+    appt_text = sections.section("appointments")
+    history_text = sections.section("medical history")
 
     medications = parse_medications_section(meds_text) if meds_text else []
     appointments = parse_appointments_section(appt_text) if appt_text else []
@@ -153,3 +289,38 @@ def parse_pdf(file_path: str, patient_id: str) -> CarePlanCreate:
         medical_history=history_text if history_text else None
     )
 
+
+def build_careplan(full_text: str, patient_id: str) -> CarePlanCreate:
+    """Turn extracted document text into a CarePlanCreate."""
+    return _careplan_from_index(index_sections(full_text), patient_id)
+
+
+def parse_pdf_with_stats(source, patient_id: str, mode: Optional[str] = None) -> Tuple[CarePlanCreate, Dict[str, Any]]:
+    """Parse PDF (a path or a seekable binary stream) and also report how
+    it was extracted.
+    mode: "lazy" stops reading pages once all sections are found,
+    "parallel" extracts every page (on the process pool when large).
+    Defaults to PDF_EXTRACT_MODE. Stats include per-stage seconds
+    (extract_s: page text + section index, parse_s: section parsing).
+    """
+    mode = mode or PDF_EXTRACT_MODE
+    t0 = time.perf_counter()
+    if mode == "lazy":
+        sections, stats = scan_pages_lazily(source)
+        if stats["pages_skipped"]:
+            print(f"[pdf_parser] lazy scan read {stats['pages_read']}/{stats['pages_total']} pages")
+    else:
+        pages = extract_pages_text(source)
+        sections = index_sections("\n".join(t for t in pages if t))
+        stats = {"mode": "parallel", "pages_total": len(pages), "pages_read": len(pages), "pages_skipped": 0}
+    t1 = time.perf_counter()
+    careplan = _careplan_from_index(sections, patient_id)
+    stats["extract_s"] = round(t1 - t0, 4)
+    stats["parse_s"] = round(time.perf_counter() - t1, 4)
+    return careplan, stats
+
+
+def parse_pdf(file_path: str, patient_id: str) -> CarePlanCreate:
+    """Parse PDF and return a CarePlanCreate object ready for Mongo insertion."""
+    careplan, _ = parse_pdf_with_stats(file_path, patient_id)
+    return careplan
@@ -1,37 +1,247 @@
 ﻿# app/routes/careplan.py
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-import tempfile, os, asyncio
-from ..pdf_parser import parse_pdf
-from ..service.crud_careplan import create_careplan, get_medication_by_patient , get_careplan
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query, Request, Response
+from fastapi.routing import APIRoute
+from typing import Any, Callable, Coroutine, List, Optional, Tuple
+import tempfile, os, asyncio, zipfile
+from ..pdf_parser import parse_pdf_with_stats
+from ..service.crud_careplan import create_careplan, apply_careplan_revision, create_careplans_bulk, get_medication_by_patient , get_careplan, get_careplan_by_id
+from ..service.crud_ingest_jobs import enqueue_job, get_job
+from ..service.crud_parse_cache import new_fingerprint, get_cached_parse, store_parse, link_careplan, record_lookup, with_fresh_ids
 from ..models import CarePlanCreate
 
-router = APIRouter()
+# Bulk ingestion: number of files parsed at once, and insert_many batch size
+BULK_PARSE_CONCURRENCY = int(os.getenv("BULK_PARSE_CONCURRENCY", "4"))
+BULK_INSERT_BATCH_SIZE = int(os.getenv("BULK_INSERT_BATCH_SIZE", "500"))
+
+# Per-file upload limit. Request bodies are also capped before the
+# multipart form is parsed (see UploadLimitRoute), so an oversized upload is
+# refused without being received in full.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+MAX_BULK_UPLOAD_BYTES = int(os.getenv("MAX_BULK_UPLOAD_BYTES", str(1024 * 1024 * 1024)))
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Zip archives in bulk uploads: max PDFs per archive and total inflated size
+ZIP_MAX_ENTRIES = int(os.getenv("ZIP_MAX_ENTRIES", "500"))
+ZIP_MAX_UNCOMPRESSED_BYTES = int(os.getenv("ZIP_MAX_UNCOMPRESSED_BYTES", str(1024 * 1024 * 1024)))
+
+
+class UploadLimitRoute(APIRoute):
+    """Rejects request bodies over the route's limit with 413 before
+    Starlette parses (and spools) the multipart form: up front from
+    Content-Length, otherwise as soon as the streamed body passes it."""
+
+    def __init__(self, path: str, *args, **kwargs):
+        bulk = path.endswith("/bulk-upload-careplans")
+        self.max_body_bytes = MAX_BULK_UPLOAD_BYTES if bulk else MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES
+        super().__init__(path, *args, **kwargs)
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def limited_handler(request: Request) -> Response:
+            limit = self.max_body_bytes
+            length = request.headers.get("content-length")
+            if length and length.isdigit() and int(length) > limit:
+                raise HTTPException(status_code=413, detail=f"request body exceeds {limit} bytes")
+            receive = request._receive
+            received = 0
+
+            async def counted_receive():
+                nonlocal received
+                message = await receive()
+                if message["type"] == "http.request":
+                    received += len(message.get("body", b""))
+                    if received > limit:
+                        raise HTTPException(status_code=413, detail=f"request body exceeds {limit} bytes")
+                return message
+
+            request._receive = counted_receive
+            return await handler(request)
+
+        return limited_handler
+
+
+router = APIRouter(route_class=UploadLimitRoute)
+
+
+def _check_upload_size(file: UploadFile) -> None:
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"{file.filename} exceeds {MAX_UPLOAD_BYTES} bytes")
+
+
+async def _fingerprint_upload(file: UploadFile) -> str:
+    """Hash an upload in place (Starlette has already spooled it) and rewind
+    it, so the parser can read the same stream. Returns the content
+    fingerprint; raises 413 over MAX_UPLOAD_BYTES."""
+    _check_upload_size(file)
+    hasher = new_fingerprint()
+    await file.seek(0)
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        hasher.update(chunk)
+    await file.seek(0)
+    return hasher.hexdigest()
 
 
 @router.post("/upload-careplan")
-async def upload_careplan(file: UploadFile = File(...)):
-    # save uploaded file to a temp file
-    suffix = os.path.splitext(file.filename)[1] or ".pdf"
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+async def upload_careplan(
+    file: UploadFile = File(...),
+    mode: Optional[str] = Query(None, description="parallel | lazy"),
+    on_duplicate: str = Query("existing", description="existing | relink: what to do when this exact PDF was parsed before"),
+    reupload: bool = Query(False, description="apply as a revision of the stored careplan instead of creating a new one"),
+):
+    # parse straight from the upload Starlette already spooled; no second copy
     try:
-        content = await file.read()
-        tmp.write(content)
-        tmp.flush()
-        tmp.close()
+        digest = await _fingerprint_upload(file)
+
+        # repeat uploads of the same bytes skip parsing entirely
+        cached = await get_cached_parse(digest)
+        if cached:
+            counters = await record_lookup(hit=True)
+            if reupload:
+                revision = await apply_careplan_revision(with_fresh_ids(cached["careplan"]))
+                return {"status": "ok", "careplan": await get_careplan_by_id(revision["careplan_id"]),
+                        "revision": revision, "cache": {"hit": True, **counters}}
+            if on_duplicate != "relink" and cached.get("careplan_id"):
+                existing = await get_careplan_by_id(cached["careplan_id"])
+                if existing:
+                    return {"status": "ok", "careplan": existing, "duplicate": True,
+                            "cache": {"hit": True, **counters}}
+            inserted = await create_careplan(with_fresh_ids(cached["careplan"]))
+            await link_careplan(digest, inserted["_id"])
+            return {"status": "ok", "careplan": inserted, "duplicate": True,
+                    "cache": {"hit": True, **counters}}
+        counters = await record_lookup(hit=False)
+
         # parse in a threadpool (pdf parsing is blocking)
         loop = asyncio.get_event_loop()
-        parsed_careplan: CarePlanCreate = await loop.run_in_executor(None, parse_pdf, tmp.name, "1")  # hardcoded patient_id="1"
-        inserted = await create_careplan(parsed_careplan.dict())  # convert to dict for Mongo insertion
+        parsed_careplan, extraction = await loop.run_in_executor(None, parse_pdf_with_stats, file.file, "1", mode)  # hardcoded patient_id="1"
+        parsed = parsed_careplan.dict()
+        if reupload:
+            revision = await apply_careplan_revision(dict(parsed))
+            await store_parse(digest, parsed, revision["careplan_id"])
+            return {"status": "ok", "careplan": await get_careplan_by_id(revision["careplan_id"]),
+                    "revision": revision, "extraction": extraction, "cache": {"hit": False, **counters}}
+        inserted = await create_careplan(dict(parsed))  # convert to dict for Mongo insertion
+        await store_parse(digest, parsed, inserted["_id"])
         # notify subscribers
 
-        return {"status": "ok", "careplan": inserted}
+        return {"status": "ok", "careplan": inserted, "extraction": extraction,
+                "cache": {"hit": False, **counters}}
 
     finally:
-        try:
-            os.unlink(tmp.name)
-        except:
-            pass
+        await file.close()
+
+
+def _expand_upload(filename: str, source, size: Optional[int], workdir: str, prefix: str) -> List[Tuple[str, Any]]:
+    """Return (name, pdf) pairs for one upload, where pdf is the upload's own
+    stream or, for zip archives, the path of each unpacked PDF. A single PDF
+    is refused (ValueError) over MAX_UPLOAD_BYTES; archives are bounded by
+    the request body limit instead, and refused past ZIP_MAX_ENTRIES PDFs or
+    ZIP_MAX_UNCOMPRESSED_BYTES in total, counting the bytes actually
+    inflated, not just the declared sizes. Blocking: run it in an executor."""
+    if not zipfile.is_zipfile(source):
+        if size is not None and size > MAX_UPLOAD_BYTES:
+            raise ValueError(f"{filename} exceeds {MAX_UPLOAD_BYTES} bytes")
+        source.seek(0)
+        return [(filename, source)]
+    entries = []
+    with zipfile.ZipFile(source) as zf:
+        infos = [info for info in zf.infolist()
+                 if not info.is_dir() and info.filename.lower().endswith(".pdf")]
+        if len(infos) > ZIP_MAX_ENTRIES:
+            raise ValueError(f"archive has {len(infos)} PDFs, limit is {ZIP_MAX_ENTRIES}")
+        if sum(info.file_size for info in infos) > ZIP_MAX_UNCOMPRESSED_BYTES:
+            raise ValueError(f"archive expands past {ZIP_MAX_UNCOMPRESSED_BYTES} bytes")
+        total = 0
+        for i, info in enumerate(infos):
+            target = os.path.join(workdir, f"{prefix}-zip{i}.pdf")
+            with zf.open(info) as src, open(target, "wb") as dst:
+                while True:
+                    chunk = src.read(UPLOAD_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    total += len(chunk)
+                    if total > ZIP_MAX_UNCOMPRESSED_BYTES:
+                        raise ValueError(f"archive expands past {ZIP_MAX_UNCOMPRESSED_BYTES} bytes")
+                    dst.write(chunk)
+            entries.append((f"{filename}/{info.filename}", target))
+    return entries
+
+
+@router.post("/bulk-upload-careplans")
+async def bulk_upload_careplans(files: List[UploadFile] = File(...), mode: Optional[str] = Query(None, description="parallel | lazy")):
+    """Ingest many care plan PDFs (or zip archives of PDFs) in one request.
+    Files are parsed concurrently (at most BULK_PARSE_CONCURRENCY at a time)
+    and stored with batched insert_many. Each file gets its own status entry;
+    a failing file does not abort the batch.
+    """
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(BULK_PARSE_CONCURRENCY)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        entries: List[Tuple[str, str]] = []
+        report: List[dict] = []
+        for i, f in enumerate(files):
+            try:
+                entries.extend(await loop.run_in_executor(None, _expand_upload, f.filename, f.file, f.size, workdir, f"upload{i}"))
+            except (zipfile.BadZipFile, ValueError) as e:
+                report.append({"filename": f.filename, "status": "error", "error": str(e)})
+
+        async def _parse(name: str, pdf):
+            async with sem:
+                try:
+                    parsed, extraction = await loop.run_in_executor(None, parse_pdf_with_stats, pdf, "1", mode)
+                    return name, parsed, extraction, None
+                except Exception as e:
+                    print(f"[bulk_upload] parse failed for {name}: {e}")
+                    return name, None, None, str(e)
+
+        results = await asyncio.gather(*(_parse(name, pdf) for name, pdf in entries))
+
+    parsed_docs = [parsed.dict() for _, parsed, _, err in results if err is None]
+    ids = await create_careplans_bulk(parsed_docs, BULK_INSERT_BATCH_SIZE) if parsed_docs else []
+
+    ids_iter = iter(ids)
+    for name, parsed, extraction, err in results:
+        if err is not None:
+            report.append({"filename": name, "status": "error", "error": err})
+            continue
+        careplan_id = next(ids_iter)
+        if careplan_id is None:
+            report.append({"filename": name, "status": "error", "error": "insert failed"})
+            continue
+        report.append({
+            "filename": name,
+            "status": "ok",
+            "careplan_id": careplan_id,
+            "medications": len(parsed.medications),
+            "appointments": len(parsed.appointments),
+            "extraction": extraction,
+        })
+
+    ok = sum(1 for r in report if r["status"] == "ok")
+    return {"status": "ok", "total": len(report), "succeeded": ok, "failed": len(report) - ok, "files": report}
+
+
+@router.post("/jobs", status_code=202)
+async def submit_careplan_job(file: UploadFile = File(...), mode: Optional[str] = Query(None, description="parallel | lazy")):
+    """Queue a care plan PDF for background parsing and return a job id
+    right away. Poll GET /jobs/{job_id} for status, stage timings and result."""
+    _check_upload_size(file)
+    await file.seek(0)
+    job = await enqueue_job(file.filename, file.file, patient_id="1", mode=mode)  # hardcoded patient_id="1"
+    return {"status": "ok", "job_id": job["id"], "job": job}
+
 
+@router.get("/jobs/{job_id}")
+async def careplan_job_status(job_id: str):
+    job = await get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"status": "ok", "job": job}
 
 
 # 🔹 New endpoint to view entire careplan
@@ -1,56 +1,138 @@
 # app/routes/chat.py
+import asyncio
+import os
+import statistics
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
 from fastapi import APIRouter, HTTPException
-from app.service.crud_careplan import get_careplan
+from app.service.careplan_context import load_careplan_context, context_stats
 from app.service.crud_chat import ask_chatbot
-from app.service.instruction_parser import parse_instruction
+from app.service.instruction_parser import parse_instruction, parse_instruction_locally, intent_stats
 from app.service.action_dispatcher import dispatch_action
 from app.models import ChatRequest, ChatResponse
 
 router = APIRouter()
 
+# Speculative mode: when the local matcher can't resolve the message, run
+# the LLM intent parse and the chatbot answer concurrently instead of one
+# after the other; the answer is cancelled if an action is recognized.
+CHAT_SPECULATIVE = os.getenv("CHAT_SPECULATIVE", "true").lower() in ("1", "true", "yes")
+# Per-request timings kept for /stats
+CHAT_TIMINGS_WINDOW = int(os.getenv("CHAT_TIMINGS_WINDOW", "500"))
+
+_timings: deque = deque(maxlen=CHAT_TIMINGS_WINDOW)
+
+
+def _consume_result(task: asyncio.Future) -> None:
+    """Done-callback for the speculative answer task: retrieve its exception
+    so a task that failed and was then dropped (an action won or the parse
+    raised) is not reported as "exception was never retrieved"."""
+    if not task.cancelled():
+        task.exception()
+
+
+async def _timed(coro, timings: Dict[str, Any], name: str):
+    started = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[f"{name}_s"] = round(time.perf_counter() - started, 4)
+
+
+async def _action_answer(parsed: Dict[str, Any]) -> Optional[str]:
+    """Dispatch a recognized action and describe the outcome; None when
+    `parsed` is not an action."""
+    if parsed.get("action") == "mark_medication":
+        dispatch_result = await dispatch_action(parsed)
+        if dispatch_result.get("success"):
+            return (
+                f"Marked {parsed.get('medication_name')} as "
+                f"{'taken' if parsed.get('taken') else 'not taken'} for {parsed.get('time')}."  # noqa: E501
+            )
+        return (
+            "Tried to update medication but failed. "
+            f"(status={dispatch_result.get('status_code') or dispatch_result.get('error')})"
+        )
+
+    if parsed.get("action") == "update_appointment":
+        dispatch_result = await dispatch_action(parsed)
+        if dispatch_result.get("success"):
+            return (
+                f"Appointment '{parsed.get('appointment_label')}' { 'confirmed' if parsed.get('status')=='confirmed' else 'declined' }."
+            )
+        return (
+            "Tried to update appointment but failed. "
+            f"(status={dispatch_result.get('status_code') or dispatch_result.get('error')})"
+        )
+
+    return None
+
+
 @router.post("/", response_model=ChatResponse)
 async def chat_endpoint(req: ChatRequest):
     """Chat endpoint with lightweight intent execution.
     Flow:
-      1. Load careplan (single patient assumption).
-      2. Parse instruction via LLM -> structured JSON.
-      3. If action recognized (mark_medication) -> dispatch -> build answer.
+      1. Load the careplan context once (single patient assumption); every step below shares it.
+      2. Resolve the instruction locally if unambiguous, else via LLM -> structured JSON.
+         In speculative mode the chatbot answer is generated alongside the LLM parse.
+      3. If action recognized (mark_medication / update_appointment) -> dispatch -> build answer.
       4. Else fallback to generic chatbot response.
     Returns only {"answer": ...} to satisfy existing response model.
     """
+    started = time.perf_counter()
+    timings: Dict[str, Any] = {"speculative": CHAT_SPECULATIVE}
+    answer_task: Optional[asyncio.Future] = None
     try:
-        careplan = await get_careplan()
-        parsed = parse_instruction(req.question, careplan or {})
-        if parsed.get("action") == "mark_medication":
-            dispatch_result = await dispatch_action(parsed)
-            if dispatch_result.get("success"):
-                answer = (
-                    f"Marked {parsed.get('medication_name')} as "
-                    f"{'taken' if parsed.get('taken') else 'not taken'} for {parsed.get('time')}."  # noqa: E501
-                )
-            else:
-                answer = (
-                    "Tried to update medication but failed. "
-                    f"(status={dispatch_result.get('status_code') or dispatch_result.get('error')})"
-                )
-            return {"answer": answer}
-
-        if parsed.get("action") == "update_appointment":
-            dispatch_result = await dispatch_action(parsed)
-            if dispatch_result.get("success"):
-                answer = (
-                    f"Appointment '{parsed.get('appointment_label')}' { 'confirmed' if parsed.get('status')=='confirmed' else 'declined' }."
-                )
-            else:
-                answer = (
-                    "Tried to update appointment but failed. "
-                    f"(status={dispatch_result.get('status_code') or dispatch_result.get('error')})"
-                )
-            return {"answer": answer}
-
-        # Fallback normal chatbot answer
-        answer = await ask_chatbot(req.question)
+        ctx = await load_careplan_context()
+        parsed = parse_instruction_locally(req.question, ctx)
+        if parsed:
+            timings["path"] = "local"
+        else:
+            if CHAT_SPECULATIVE:
+                answer_task = asyncio.ensure_future(_timed(ask_chatbot(req.question, ctx), timings, "answer"))
+                answer_task.add_done_callback(_consume_result)
+            parsed = await _timed(parse_instruction(req.question, ctx, try_local=False), timings, "parse")
+            timings["path"] = "llm"
+
+        answer = await _action_answer(parsed)
+        if answer is not None:
+            timings["outcome"] = "action"
+            if answer_task is not None:
+                answer_task.cancel()
+                timings["answer_cancelled"] = True
+        else:
+            timings["outcome"] = "answer"
+            # Fallback normal chatbot answer
+            answer = await (answer_task or _timed(ask_chatbot(req.question, ctx), timings, "answer"))
         return {"answer": answer}
     except Exception as e:
         print(f"[chat_endpoint] Exception: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if answer_task is not None and not answer_task.done():
+            answer_task.cancel()
+        timings["total_s"] = round(time.perf_counter() - started, 4)
+        _timings.append(timings)
+
+
+def _timing_summary() -> dict:
+    out: Dict[str, Any] = {"speculative": CHAT_SPECULATIVE, "requests": len(_timings)}
+    for outcome in ("action", "answer"):
+        rows = [t for t in _timings if t.get("outcome") == outcome]
+        summary: Dict[str, Any] = {"requests": len(rows)}
+        for field in ("parse_s", "answer_s", "total_s"):
+            values = [t[field] for t in rows if field in t]
+            if values:
+                summary[f"{field[:-2]}_p50_s"] = round(statistics.median(values), 4)
+        out[outcome] = summary
+    return out
+
+
+@router.get("/stats")
+async def chat_stats():
+    """Intent parsing counters (local matcher vs LLM), careplan context reuse
+    and recent per-request timings of the parse and answer branches, split
+    by outcome."""
+    return {"intent": intent_stats(), "careplan_context": context_stats(), "timings": _timing_summary()}
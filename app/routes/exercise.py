@@ -1,10 +1,15 @@
+import json
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from app.service import crud_careplan
 from app.service.crud_ai_diet_exercise import (
     generate_diet_exercise_plan,
     generate_only_diet_plan,
     generate_only_exercise_plan,
+    stream_diet_exercise_plan,
 )
+from app.utils.ai_agent import FOOD_IMAGE_CACHE, LLM_CACHE
+from app.service.crud_media_catalog import catalog_stats
 
 router = APIRouter()
 
@@ -23,6 +28,17 @@ async def get_diet_exercise():
     plan = await generate_diet_exercise_plan(medical_history)
     return {"status": "ok", "diet_exercise_plan": plan}
 
+@router.get("/stream", summary="Stream Diet & Exercise Plan (Server-Sent Events)")
+async def stream_diet_exercise():
+    medical_history = await _get_med_history()
+
+    async def events():
+        async for event, data in stream_diet_exercise_plan(medical_history):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @router.get("/diet", summary="Get Diet Plan Only")
 async def get_diet_only():
     medical_history = await _get_med_history()
@@ -34,3 +50,15 @@ async def get_exercise_only():
     medical_history = await _get_med_history()
     workouts = await generate_only_exercise_plan(medical_history)
     return {"status": "ok", "exercise_plan": workouts["exercise_plan"]}
+
+@router.get("/image-cache/stats", summary="Food image cache hit ratio and size")
+async def get_image_cache_stats():
+    return {"status": "ok", "image_cache": await FOOD_IMAGE_CACHE.stats()}
+
+@router.get("/llm-cache/stats", summary="LLM response cache hit ratio and size")
+async def get_llm_cache_stats():
+    return {"status": "ok", "llm_cache": await LLM_CACHE.stats()}
+
+@router.get("/catalog/stats", summary="Offline image/video catalog size and hit rate")
+async def get_catalog_stats():
+    return {"status": "ok", "catalog": catalog_stats()}
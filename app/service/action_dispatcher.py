@@ -1,42 +1,94 @@
 import os
-from typing import Dict, Any
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
 import httpx
 
+from app.service.crud_medications import toggle_schedule_taken
+from app.service.crud_appointments import update_appointment_status
+
+# "inprocess" calls the service functions behind the endpoints directly;
+# "http" POSTs to the endpoints on INTERNAL_API_BASE (split deployments).
+ACTION_DISPATCH_MODE = os.getenv("ACTION_DISPATCH_MODE", "inprocess").lower()
 # Internal base URL (same service or gateway). Override via env if needed.
 BASE_INTERNAL_URL = os.getenv("INTERNAL_API_BASE", "http://localhost:8000")
+ACTION_HTTP_TIMEOUT = float(os.getenv("ACTION_HTTP_TIMEOUT", "10"))
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+async def _mark_medication(action: Dict[str, Any]) -> Tuple[int, Any]:
+    return 200, await toggle_schedule_taken(action["medication_id"], action["time"], action["taken"])
+
+
+async def _update_appointment(action: Dict[str, Any]) -> Tuple[int, Any]:
+    careplan = await update_appointment_status(action["appointment_id"], action["status"])
+    if not careplan:
+        return 404, {"detail": "Appointment not found"}
+    return 200, {"status": "ok"}
+
+
+# Action -> in-process handler returning (status code, body) the way the
+# matching endpoint in routes/ would
+ACTION_HANDLERS: Dict[str, Callable[[Dict[str, Any]], Awaitable[Tuple[int, Any]]]] = {
+    "mark_medication": _mark_medication,
+    "update_appointment": _update_appointment,
+}
+
+
+def _endpoint(action: Dict[str, Any]) -> Optional[str]:
+    act = action.get("action")
+    if act == "mark_medication":
+        return f"/api/medications/api/{action['medication_id']}/schedule/{action['time']}/" + ("taken" if action["taken"] else "not-taken")
+    if act == "update_appointment":
+        return f"/api/appointments/{action['appointment_id']}/" + ("confirm" if action["status"] == "confirmed" else "decline")
+    return None
+
+
+async def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(base_url=BASE_INTERNAL_URL.rstrip("/"), timeout=ACTION_HTTP_TIMEOUT)
+    return _client
+
+
+async def close_action_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def _post(endpoint: str) -> Tuple[int, str]:
+    client = await _get_client()
+    resp = await client.post(endpoint)
+    return resp.status_code, resp.text
+
 
 async def dispatch_action(action: Dict[str, Any]) -> Dict[str, Any]:
-    """Execute parsed action by calling existing endpoints.
+    """Execute parsed action, in process or through the existing endpoints
+    (ACTION_DISPATCH_MODE).
     Supports:
       - mark_medication
       - update_appointment (confirm / decline)
-    Returns structured result for debugging.
+    Returns structured result for debugging; `endpoint` is the route the
+    action corresponds to in either mode.
     """
-    act = action.get("action")
-
-    if act == "mark_medication":
-        medication_id = action["medication_id"]
-        time_slot = action["time"]
-        taken = action["taken"]
-        endpoint = f"/api/medications/api/{medication_id}/schedule/{time_slot}/" + ("taken" if taken else "not-taken")
-    elif act == "update_appointment":
-        appointment_id = action["appointment_id"]
-        status = action["status"]  # confirmed | declined
-        endpoint = f"/api/appointments/{appointment_id}/" + ("confirm" if status == "confirmed" else "decline")
-    else:
+    handler = ACTION_HANDLERS.get(action.get("action"))
+    if handler is None:
         return {"success": False, "error": "unsupported_action"}
 
-    url = BASE_INTERNAL_URL.rstrip("/") + endpoint
+    endpoint = _endpoint(action)
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.post(url)
+        if ACTION_DISPATCH_MODE == "http":
+            status_code, body = await _post(endpoint)
+        else:
+            status_code, body = await handler(action)
         data = {
-            "success": 200 <= resp.status_code < 300,
-            "status_code": resp.status_code,
+            "success": 200 <= status_code < 300,
+            "status_code": status_code,
             "endpoint": endpoint,
         }
         if not data["success"]:
-            data["body"] = resp.text[:500]
+            data["body"] = str(body)[:500]
         print(f"[action_dispatcher] Dispatch result: {data}")
         return data
     except Exception as e:
@@ -0,0 +1,99 @@
+# app/service/careplan_context.py
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from ..database import db
+
+# Careplan view shared by everything one /api/chat request does (intent
+# matching, LLM parsing, the chatbot prompt). The careplan is read once per
+# request with a projection; the derived lookup indexes and prompt text are
+# memoized by a hash of that projection ("version"), so they are rebuilt
+# only after the plan actually changes (a medication marked taken, an
+# appointment confirmed, a revision applied...).
+CAREPLANS_COLL = "careplans"
+CAREPLAN_CONTEXT_FIELDS = {"patient_id": 1, "medications": 1, "appointments": 1, "reminder_slots": 1, "medical_history": 1}
+CAREPLAN_CONTEXT_MAX_ENTRIES = int(os.getenv("CAREPLAN_CONTEXT_MAX_ENTRIES", "8"))
+
+_contexts: "OrderedDict[str, CareplanContext]" = OrderedDict()
+_stats: Dict[str, int] = {"hits": 0, "misses": 0}
+
+
+def _build_appointment_index(careplan: dict) -> Dict[str, Dict[str, Any]]:
+    """Case-insensitive map from an appointment label to its object.
+    Uses 'type' if present, otherwise falls back to id.
+    """
+    appts: Dict[str, Dict[str, Any]] = {}
+    for appt in (careplan or {}).get("appointments", []):
+        label = (appt.get("type") or appt.get("id") or "").strip()
+        if label:
+            appts[label.lower()] = appt
+    return appts
+
+
+def _build_medication_index(careplan: dict) -> Dict[str, Dict[str, Any]]:
+    """Case-insensitive map from medication name to its object."""
+    meds: Dict[str, Dict[str, Any]] = {}
+    for med in (careplan or {}).get("medications", []):
+        name = (med.get("name") or "").strip()
+        if name:
+            meds[name.lower()] = med
+    return meds
+
+
+class CareplanContext:
+    """One careplan version and what the chat flow derives from it. Shared
+    between requests: treat as read-only."""
+
+    def __init__(self, careplan: Optional[dict], version: str):
+        self.careplan: dict = careplan or {}
+        self.version = version
+        self.medication_index = _build_medication_index(self.careplan)
+        self.appointment_index = _build_appointment_index(self.careplan)
+        self.medication_names: List[str] = list(self.medication_index.keys())
+        self.appointment_labels: List[str] = list(self.appointment_index.keys())
+        self.careplan_text = str(self.careplan) if careplan else "No careplan available"
+
+
+def careplan_version(careplan: Optional[dict]) -> str:
+    if not careplan:
+        return "none"
+    return hashlib.sha256(json.dumps(careplan, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def context_for(careplan: Optional[dict]) -> CareplanContext:
+    """Memoized context for this careplan content."""
+    version = careplan_version(careplan)
+    ctx = _contexts.get(version)
+    if ctx is None:
+        _stats["misses"] += 1
+        ctx = _contexts[version] = CareplanContext(careplan, version)
+        while len(_contexts) > CAREPLAN_CONTEXT_MAX_ENTRIES:
+            _contexts.popitem(last=False)
+    else:
+        _stats["hits"] += 1
+    _contexts.move_to_end(version)
+    return ctx
+
+
+async def _fetch_careplan() -> Optional[dict]:
+    """The single careplan (same assumption as crud_careplan.get_careplan),
+    only the fields the chat flow uses."""
+    doc = await db[CAREPLANS_COLL].find_one({}, CAREPLAN_CONTEXT_FIELDS)
+    if not doc:
+        return None
+    doc["id"] = str(doc.pop("_id"))
+    return doc
+
+
+async def load_careplan_context() -> CareplanContext:
+    """Read the careplan once for this request and return its context."""
+    return context_for(await _fetch_careplan())
+
+
+def context_stats() -> dict:
+    lookups = _stats["hits"] + _stats["misses"]
+    return {**_stats, "cached_versions": len(_contexts),
+            "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else None}
@@ -1,45 +1,323 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.service.crud_cache import TwoTierCache
 from app.utils.ai_agent import (
     parse_sections,
-    extract_entities,
-    generate_suggestions
+    extract_entities_async,
+    suggest_async,
+    diet_intro_async,
+    suggested_diet_items,
+    suggested_exercise_items,
+    enrich_diet_item_async,
+    enrich_exercise_item_async,
+    ENRICH_CONCURRENCY,
+    SUGGESTIONS_FALLBACK
 )
-import asyncio
 
-# Original synchronous logic extracted into a private helper so we can run it in a thread pool
+# Plans are memoized by a hash of the medical history they were generated
+# from, so editing the careplan's history simply moves requests to a new key.
+# The diet and exercise halves are stored separately ("<key>:diet",
+# "<key>:exercise") so each endpoint only ever computes its own half; the
+# extracted entities the combined endpoint reports go in "<key>:extraction".
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "128"))
+PLAN_CACHE_TTL_SECONDS = int(os.getenv("PLAN_CACHE_TTL_SECONDS", str(24 * 3600)))
+PLAN_CACHE = TwoTierCache("diet_exercise_plan_cache", PLAN_CACHE_MAX_ENTRIES)
+# Pipelines kept in memory so diet and exercise requests share upstream
+# stages; dropped once both halves are in PLAN_CACHE, and never reused past
+# PLAN_CACHE_TTL_SECONDS so finished stages can't outlive the cached plan.
+PLAN_PIPELINES_MAX_ENTRIES = int(os.getenv("PLAN_PIPELINES_MAX_ENTRIES", "32"))
 
-def _generate_diet_exercise_plan_sync(medical_history: str) -> dict:
-    sections = parse_sections(medical_history)
-    extraction = extract_entities(
-        medical_history,
-        sections.get('lab_reports', ''),
-        sections.get('allergies', '')
-    )
-    suggestions = generate_suggestions(
-        extraction.get('conditions', []),
-        extraction.get('concern', ''),
-        sections.get('current_diet', ''),
-        extraction.get('lab_metrics', []),
-        extraction.get('allergies', [])
+_inflight: Dict[str, asyncio.Future] = {}
+_pipelines: "OrderedDict[str, PlanPipeline]" = OrderedDict()
+
+
+def plan_key(medical_history: str) -> str:
+    return hashlib.sha256(medical_history.encode("utf-8")).hexdigest()
+
+
+async def _single_flight(key: str, factory: Callable[[], Awaitable]):
+    """Run factory() once per key at a time; concurrent callers await the
+    same result. The shared task is shielded, so one caller disconnecting
+    does not cancel it for the others."""
+    fut = _inflight.get(key)
+    if fut is None:
+        fut = asyncio.ensure_future(factory())
+        _inflight[key] = fut
+        fut.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(fut)
+
+
+class PlanPipeline:
+    """Lazily evaluated stages of the diet/exercise pipeline for one medical
+    history:
+
+        sections -> extraction -> suggestions -> diet_item n (image)     -> diet_plan
+                                              -> exercise_item n (video) -> exercise_plan
+
+    A stage runs only when something downstream asks for it, at most once
+    (concurrent callers share the running task); a stage that raised, or
+    whose result `failed` rejects, is retried on the next call. Items are
+    stages of their own so the streaming endpoint and the plan endpoints
+    share each lookup; at most ENRICH_CONCURRENCY run at a time.
+    """
+
+    def __init__(self, medical_history: str):
+        self.medical_history = medical_history
+        self.sections: Dict[str, str] = parse_sections(medical_history)
+        self.created = time.monotonic()
+        self._stages: Dict[str, asyncio.Future] = {}
+        self._enrich_limit = asyncio.Semaphore(max(1, ENRICH_CONCURRENCY))
+
+    def _stage(self, name: str, factory: Callable[[], Awaitable],
+               failed: Optional[Callable[[object], bool]] = None) -> Awaitable:
+        task = self._stages.get(name)
+        if task is None or (task.done() and (task.cancelled() or task.exception() is not None
+                                             or (failed is not None and failed(task.result())))):
+            task = asyncio.ensure_future(factory())
+            self._stages[name] = task
+        return asyncio.shield(task)
+
+    async def extraction(self) -> Dict:
+        return await self._stage("extraction", lambda: extract_entities_async(
+            self.medical_history,
+            self.sections.get('lab_reports', ''),
+            self.sections.get('allergies', '')
+        ))
+
+    async def _suggest(self) -> Optional[Dict]:
+        extraction = await self.extraction()
+        return await suggest_async(
+            extraction.get('conditions', []),
+            extraction.get('concern', ''),
+            extraction.get('lab_metrics', []),
+            extraction.get('allergies', [])
+        )
+
+    async def suggestions(self) -> Optional[Dict]:
+        """Raw LLM suggestions (diet and exercise come from the same call)."""
+        return await self._stage("suggestions", self._suggest, failed=lambda r: r is None)
+
+    async def _diet_intro(self) -> List[Dict[str, str]]:
+        extraction = await self.extraction()
+        return await diet_intro_async(
+            self.sections.get('current_diet', ''),
+            extraction.get('conditions', []),
+            extraction.get('concern', ''),
+            extraction.get('lab_metrics', []),
+            extraction.get('allergies', [])
+        )
+
+    async def diet_intro(self) -> List[Dict[str, str]]:
+        return await self._stage("diet_intro", self._diet_intro)
+
+    async def diet_items(self) -> Optional[List[Dict[str, str]]]:
+        """Suggested foods (allergens dropped), or None if the suggestions
+        call failed."""
+        suggestions, extraction = await asyncio.gather(self.suggestions(), self.extraction())
+        if suggestions is None:
+            return None
+        return suggested_diet_items(suggestions, extraction.get('allergies', []))
+
+    async def exercise_items(self) -> Optional[List[Dict[str, str]]]:
+        suggestions = await self.suggestions()
+        if suggestions is None:
+            return None
+        return suggested_exercise_items(suggestions)
+
+    async def _enrich(self, coro: Awaitable):
+        async with self._enrich_limit:
+            return await coro
+
+    async def _diet_item(self, item: Dict[str, str]) -> Optional[Dict[str, str]]:
+        allergies = (await self.extraction()).get('allergies', [])
+        return await self._enrich(enrich_diet_item_async(item, allergies))
+
+    async def diet_item(self, index: int, item: Dict[str, str]) -> Optional[Dict[str, str]]:
+        """Suggested food `index` (of diet_items()) with its image; None drops it."""
+        return await self._stage(f"diet_item:{index}", lambda: self._diet_item(item))
+
+    async def exercise_item(self, index: int, item: Dict[str, str]) -> Optional[Dict[str, str]]:
+        """Suggested exercise `index` (of exercise_items()) with its video; None drops it."""
+        return await self._stage(f"exercise_item:{index}", lambda: self._enrich(enrich_exercise_item_async(item)))
+
+    async def _diet_plan(self) -> Tuple[List, bool]:
+        items = await self.diet_items()
+        if items is None:
+            return list(SUGGESTIONS_FALLBACK['diet_plan']), False
+        intro, enriched = await asyncio.gather(
+            self.diet_intro(),
+            asyncio.gather(*(self.diet_item(i, item) for i, item in enumerate(items)))
+        )
+        return intro + [r for r in enriched if r], True
+
+    async def diet_plan(self) -> Tuple[List, bool]:
+        """(diet plan, ok); ok is False when the suggestions call failed."""
+        return await self._stage("diet_plan", self._diet_plan, failed=lambda r: not r[1])
+
+    async def _exercise_plan(self) -> Tuple[List, bool]:
+        items = await self.exercise_items()
+        if items is None:
+            return list(SUGGESTIONS_FALLBACK['exercise_plan']), False
+        enriched = await asyncio.gather(*(self.exercise_item(i, item) for i, item in enumerate(items)))
+        return [r for r in enriched if r], True
+
+    async def exercise_plan(self) -> Tuple[List, bool]:
+        return await self._stage("exercise_plan", self._exercise_plan, failed=lambda r: not r[1])
+
+
+def get_pipeline(medical_history: str) -> PlanPipeline:
+    key = plan_key(medical_history)
+    pipeline = _pipelines.get(key)
+    if pipeline is None or time.monotonic() - pipeline.created > PLAN_CACHE_TTL_SECONDS:
+        pipeline = _pipelines[key] = PlanPipeline(medical_history)
+    _pipelines.move_to_end(key)
+    while len(_pipelines) > PLAN_PIPELINES_MAX_ENTRIES:
+        _pipelines.popitem(last=False)
+    return pipeline
+
+
+def _release_pipeline(key: str) -> None:
+    """Forget the pipeline for `key` once both halves are cached; later
+    requests are served from PLAN_CACHE."""
+    if PLAN_CACHE.has_local(f"{key}:diet") and PLAN_CACHE.has_local(f"{key}:exercise"):
+        _pipelines.pop(key, None)
+
+
+async def _memoized(key: str, compute: Callable[[], Awaitable[Tuple[object, bool]]]):
+    """PLAN_CACHE lookup, else compute() once (single-flight) and store the
+    value if compute reported it as ok; failed generations are not pinned."""
+    cached = await PLAN_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    async def run():
+        value, ok = await compute()
+        if ok:
+            await PLAN_CACHE.set(key, value, PLAN_CACHE_TTL_SECONDS)
+            _release_pipeline(key.rsplit(":", 1)[0])
+        return value
+
+    return await _single_flight(key, run)
+
+
+# The pipeline is looked up only on a PLAN_CACHE miss, so cached requests
+# don't bring a released pipeline back.
+async def _diet_plan(medical_history: str) -> list:
+    return await _memoized(f"{plan_key(medical_history)}:diet", lambda: get_pipeline(medical_history).diet_plan())
+
+
+async def _exercise_plan(medical_history: str) -> list:
+    return await _memoized(f"{plan_key(medical_history)}:exercise", lambda: get_pipeline(medical_history).exercise_plan())
+
+
+async def _extraction(medical_history: str) -> Dict:
+    async def compute() -> Tuple[Dict, bool]:
+        return await get_pipeline(medical_history).extraction(), True
+    return await _memoized(f"{plan_key(medical_history)}:extraction", compute)
+
+
+async def generate_diet_exercise_plan(medical_history: str) -> dict:
+    diet_plan, exercise_plan, extraction = await asyncio.gather(
+        _diet_plan(medical_history), _exercise_plan(medical_history), _extraction(medical_history)
     )
     return {
         "status": "success",
-        "diet_plan": suggestions.get('diet_plan', ["Try to include the following foods to improve your diet"]),
-        "exercise_plan": suggestions.get('exercise_plan', ["None"]),
+        "diet_plan": diet_plan,
+        "exercise_plan": exercise_plan,
         # keep raw sections if needed for debugging in separated endpoints
-        "_sections": sections,
+        "_sections": parse_sections(medical_history),
         "_extraction": extraction
     }
 
-# New async wrapper to avoid blocking the event loop with heavy synchronous network I/O
-async def generate_diet_exercise_plan(medical_history: str) -> dict:
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, lambda: _generate_diet_exercise_plan_sync(medical_history))
-
-# New separated convenience helpers
+# Separated helpers: each runs only the stages its half of the plan needs
 async def generate_only_diet_plan(medical_history: str) -> dict:
-    data = await generate_diet_exercise_plan(medical_history)
-    return {"status": data["status"], "diet_plan": data["diet_plan"]}
+    return {"status": "success", "diet_plan": await _diet_plan(medical_history)}
 
 async def generate_only_exercise_plan(medical_history: str) -> dict:
-    data = await generate_diet_exercise_plan(medical_history)
-    return {"status": data["status"], "exercise_plan": data["exercise_plan"]}
\ No newline at end of file
+    return {"status": "success", "exercise_plan": await _exercise_plan(medical_history)}
+
+
+async def _tagged(kind: str, index: int, result: Awaitable):
+    return kind, index, await result
+
+
+async def stream_diet_exercise_plan(medical_history: str) -> AsyncIterator[Tuple[str, dict]]:
+    """The combined plan as (event, data) pairs, for SSE:
+
+        diet_analysis  {"analysis": ...}                  first, once ready
+        diet_item      {"index": n, nutrient, food, ...}  as each image resolves
+        exercise_item  {"index": n, name, ...}            as each video resolves
+        summary        {"diet_plan", "exercise_plan", "cached", "elapsed_s"}
+        error          {"detail": ...}                    instead of items on failure
+
+    `index` is the item's position in the model's suggestions, so clients can
+    keep that order. A half already in PLAN_CACHE is replayed; a missing one
+    goes through the same single-flight and pipeline stages as /diet and
+    /workouts (which store it in PLAN_CACHE), and its events are emitted as
+    those stages finish, so concurrent requests never compute an item twice.
+    A client that disconnects stops waiting but does not cancel the shared
+    work; its result is still cached."""
+    started = time.perf_counter()
+    key = plan_key(medical_history)
+    diet_cached = await PLAN_CACHE.get(f"{key}:diet")
+    exercise_cached = await PLAN_CACHE.get(f"{key}:exercise")
+
+    halves: Dict[str, asyncio.Future] = {}
+    if diet_cached is None:
+        halves["diet"] = asyncio.ensure_future(_diet_plan(medical_history))
+    if exercise_cached is None:
+        halves["exercise"] = asyncio.ensure_future(_exercise_plan(medical_history))
+    pipeline = get_pipeline(medical_history) if halves else None
+    item_tasks: List[asyncio.Future] = []
+
+    try:
+        if diet_cached is not None:
+            intro = [e for e in diet_cached if "analysis" in e]
+        else:
+            intro = await pipeline.diet_intro()
+        for entry in intro:
+            yield "diet_analysis", entry
+        if diet_cached is not None:
+            for i, entry in enumerate(e for e in diet_cached if "analysis" not in e):
+                yield "diet_item", {"index": i, **entry}
+        if exercise_cached is not None:
+            for i, entry in enumerate(exercise_cached):
+                yield "exercise_item", {"index": i, **entry}
+
+        if halves:
+            diet_items = await pipeline.diet_items() if "diet" in halves else []
+            exercise_items = await pipeline.exercise_items() if "exercise" in halves else []
+            if diet_items is None or exercise_items is None:
+                yield "error", {"detail": "suggestion generation failed"}
+                yield "summary", {"diet_plan": diet_cached or list(SUGGESTIONS_FALLBACK['diet_plan']),
+                                  "exercise_plan": exercise_cached or list(SUGGESTIONS_FALLBACK['exercise_plan']),
+                                  "cached": False, "elapsed_s": round(time.perf_counter() - started, 4)}
+                return
+            item_tasks = [asyncio.ensure_future(_tagged("diet_item", i, pipeline.diet_item(i, item)))
+                          for i, item in enumerate(diet_items)]
+            item_tasks += [asyncio.ensure_future(_tagged("exercise_item", i, pipeline.exercise_item(i, item)))
+                           for i, item in enumerate(exercise_items)]
+            for fut in asyncio.as_completed(item_tasks):
+                kind, index, result = await fut
+                if result:
+                    yield kind, {"index": index, **result}
+
+        diet_plan = diet_cached if diet_cached is not None else await halves["diet"]
+        exercise_plan = exercise_cached if exercise_cached is not None else await halves["exercise"]
+        yield "summary", {"diet_plan": diet_plan, "exercise_plan": exercise_plan,
+                          "cached": not halves, "elapsed_s": round(time.perf_counter() - started, 4)}
+    except Exception as e:
+        print(f"[diet_exercise] stream failed: {e}")
+        yield "error", {"detail": str(e)}
+    finally:
+        # Stop waiting; the shared stages keep running for other callers
+        for task in item_tasks + list(halves.values()):
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()
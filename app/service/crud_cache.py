@@ -0,0 +1,144 @@
+# app/service/crud_cache.py
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+from pymongo import UpdateOne
+
+from ..database import db
+
+
+class TwoTierCache:
+    """Bounded in-process LRU in front of a shared Mongo collection.
+
+    Every entry carries its own TTL. The Mongo tier is shared by all workers
+    and survives restarts; expired documents are removed by a TTL index on
+    `expires_at` (see ensure_indexes) and ignored on read until then. Mongo
+    errors are logged and treated as misses, so the cache never fails a
+    request. Hit/miss counters are per process.
+    """
+
+    def __init__(self, collection: str, max_entries: int):
+        self.collection = collection
+        self.max_entries = max_entries
+        self._local: "OrderedDict[str, tuple]" = OrderedDict()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _get_local(self, key: str) -> Optional[Any]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires <= time.time():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return value
+
+    def _set_local(self, key: str, value: Any, ttl: float) -> None:
+        self._local[key] = (value, time.time() + ttl)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    def has_local(self, key: str) -> bool:
+        """Whether the in-process tier holds `key` (not counted in stats)."""
+        return self._get_local(key) is not None
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self._get_local(key)
+        if value is not None:
+            self.local_hits += 1
+            return value
+        now = datetime.utcnow()
+        try:
+            doc = await db[self.collection].find_one({"_id": key, "expires_at": {"$gt": now}})
+        except Exception as e:
+            print(f"[cache] {self.collection} read failed: {e}")
+            doc = None
+        if doc is None:
+            self.misses += 1
+            return None
+        self.shared_hits += 1
+        self._set_local(key, doc["value"], (doc["expires_at"] - now).total_seconds())
+        return doc["value"]
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._set_local(key, value, ttl)
+        now = datetime.utcnow()
+        try:
+            await db[self.collection].update_one(
+                {"_id": key},
+                {"$set": {"value": value, "expires_at": now + timedelta(seconds=ttl), "updated_at": now}},
+                upsert=True,
+            )
+        except Exception as e:
+            print(f"[cache] {self.collection} write failed: {e}")
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Values for the keys that are cached, with one Mongo query ($in)
+        for everything the local tier doesn't hold."""
+        found: Dict[str, Any] = {}
+        remote = []
+        for key in dict.fromkeys(keys):
+            value = self._get_local(key)
+            if value is None:
+                remote.append(key)
+            else:
+                self.local_hits += 1
+                found[key] = value
+        if remote:
+            now = datetime.utcnow()
+            try:
+                async for doc in db[self.collection].find({"_id": {"$in": remote}, "expires_at": {"$gt": now}}):
+                    found[doc["_id"]] = doc["value"]
+                    self.shared_hits += 1
+                    self._set_local(doc["_id"], doc["value"], (doc["expires_at"] - now).total_seconds())
+            except Exception as e:
+                print(f"[cache] {self.collection} read failed: {e}")
+            self.misses += sum(1 for key in remote if key not in found)
+        return found
+
+    async def set_many(self, values: Dict[str, Any], ttl: float) -> None:
+        """set() for several keys in one bulk write."""
+        if not values:
+            return
+        now = datetime.utcnow()
+        ops = []
+        for key, value in values.items():
+            self._set_local(key, value, ttl)
+            ops.append(UpdateOne(
+                {"_id": key},
+                {"$set": {"value": value, "expires_at": now + timedelta(seconds=ttl), "updated_at": now}},
+                upsert=True,
+            ))
+        try:
+            await db[self.collection].bulk_write(ops, ordered=False)
+        except Exception as e:
+            print(f"[cache] {self.collection} write failed: {e}")
+
+    async def ensure_indexes(self) -> None:
+        try:
+            await db[self.collection].create_index("expires_at", expireAfterSeconds=0)
+        except Exception as e:
+            print(f"[cache] {self.collection} index creation failed: {e}")
+
+    async def stats(self) -> dict:
+        lookups = self.local_hits + self.shared_hits + self.misses
+        try:
+            shared_entries = await db[self.collection].count_documents({"expires_at": {"$gt": datetime.utcnow()}})
+        except Exception as e:
+            print(f"[cache] {self.collection} count failed: {e}")
+            shared_entries = None
+        return {
+            "local_entries": len(self._local),
+            "local_max_entries": self.max_entries,
+            "shared_entries": shared_entries,
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.local_hits + self.shared_hits) / lookups, 4) if lookups else None,
+        }
@@ -1,6 +1,12 @@
 # app/crud.py
 import uuid
 from datetime import datetime
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
 from app.service.crud_doctor_availabilty import get_doctor_by_specialty
 from app.utils.ai_agent import assign_slot_to_appointment
@@ -19,11 +25,14 @@ async def get_careplan_by_appointment_id(appointment_id: str):
     appointment = next((a for a in doc["appointments"] if a["id"] == appointment_id), None)
     return doc, appointment
 
-async def create_careplan(careplan: dict) -> dict:
+async def insert_careplan(careplan: dict) -> dict:
     careplan["created_at"] = datetime.utcnow()
     res = await db[CAREPLANS_COLL].insert_one(careplan)
     careplan["_id"] = str(res.inserted_id)
+    return careplan
 
+
+async def auto_assign_slots(careplan: dict) -> None:
     if "patient_id" in careplan:
         patient_id = careplan["patient_id"]
 
@@ -38,9 +47,163 @@ async def create_careplan(careplan: dict) -> dict:
                         await assign_slot_to_appointment(patient_id, appt["id"], doctor["doctor_id"])
                         break  # assign one slot for demo
 
+
+async def create_careplan(careplan: dict) -> dict:
+    await insert_careplan(careplan)
+    await auto_assign_slots(careplan)
     return careplan
 
 
+def _entity_key(label: Optional[str]) -> str:
+    """Stable key for matching a re-parsed medication/appointment to the stored one."""
+    return " ".join((label or "").lower().split())
+
+
+def _pair_entities(stored: List[dict], parsed: List[dict], label: str,
+                   tiebreak: Optional[str] = None) -> Tuple[List[Tuple[dict, dict]], List[dict], List[dict]]:
+    """Match parsed entries to stored ones by _entity_key(label). Labels need
+    not be unique (e.g. Metformin 500mg morning + Metformin 1000mg night):
+    within a label, entries with an equal `tiebreak` field pair first, the
+    rest pair in document order. Returns (pairs, added, removed)."""
+    by_key: dict = {}
+    for old in stored:
+        by_key.setdefault(_entity_key(old.get(label)), []).append(old)
+    pairs: List[Tuple[dict, dict]] = []
+    unmatched: List[dict] = []
+    for new in parsed:
+        olds = by_key.get(_entity_key(new.get(label)), [])
+        old = next((o for o in olds if o.get(tiebreak) == new.get(tiebreak)), None) if tiebreak else None
+        if old is None:
+            unmatched.append(new)
+        else:
+            olds.remove(old)
+            pairs.append((old, new))
+    added: List[dict] = []
+    for new in unmatched:
+        olds = by_key.get(_entity_key(new.get(label)), [])
+        if olds:
+            pairs.append((olds.pop(0), new))
+        else:
+            added.append(new)
+    removed = [old for olds in by_key.values() for old in olds]
+    return pairs, added, removed
+
+
+def diff_careplan(stored: dict, parsed: dict) -> Tuple[List[UpdateOne], dict]:
+    """Compare a freshly parsed careplan against the stored document.
+    Medications are matched by name (then dose) and appointments by type,
+    see _pair_entities. Matched entries keep their id, taken flags and
+    status; only changed fields are $set.
+    Returns the update operations and a summary of the changes.
+    """
+    _id = stored["_id"]
+    ops: List[UpdateOne] = []
+    changes = {
+        "medications": {"added": [], "removed": [], "updated": []},
+        "appointments": {"added": [], "removed": []},
+        "medical_history_changed": False,
+    }
+
+    med_pairs, added_meds, removed_meds = _pair_entities(
+        stored.get("medications", []), parsed.get("medications", []), "name", tiebreak="dose")
+
+    if added_meds:
+        ops.append(UpdateOne({"_id": _id}, {"$push": {"medications": {"$each": added_meds}}}))
+        changes["medications"]["added"] = [m.get("name") for m in added_meds]
+
+    for old, new in med_pairs:
+        fields = {}
+        for f in ("dose", "duration"):
+            if new.get(f) != old.get(f):
+                fields[f"medications.$[m].{f}"] = new.get(f)
+        old_taken = {s.get("time"): s.get("taken") for s in old.get("schedule", [])}
+        new_times = [s.get("time") for s in new.get("schedule", [])]
+        if new_times != list(old_taken):
+            fields["medications.$[m].schedule"] = [{"time": t, "taken": old_taken.get(t)} for t in new_times]
+        if fields:
+            ops.append(UpdateOne({"_id": _id}, {"$set": fields}, array_filters=[{"m.id": old.get("id")}]))
+            changes["medications"]["updated"].append(old.get("name"))
+
+    if removed_meds:
+        ops.append(UpdateOne({"_id": _id}, {"$pull": {"medications": {"id": {"$in": [m.get("id") for m in removed_meds]}}}}))
+        changes["medications"]["removed"] = [m.get("name") for m in removed_meds]
+
+    _, added_appts, removed_appts = _pair_entities(
+        stored.get("appointments", []), parsed.get("appointments", []), "type")
+
+    if added_appts:
+        ops.append(UpdateOne({"_id": _id}, {"$push": {"appointments": {"$each": added_appts}}}))
+        changes["appointments"]["added"] = [a.get("type") for a in added_appts]
+    if removed_appts:
+        ops.append(UpdateOne({"_id": _id}, {"$pull": {"appointments": {"id": {"$in": [a.get("id") for a in removed_appts]}}}}))
+        changes["appointments"]["removed"] = [a.get("type") for a in removed_appts]
+
+    if parsed.get("medical_history") != stored.get("medical_history"):
+        ops.append(UpdateOne({"_id": _id}, {"$set": {"medical_history": parsed.get("medical_history")}}))
+        changes["medical_history_changed"] = True
+
+    return ops, changes
+
+
+async def apply_careplan_revision(parsed: dict) -> dict:
+    """Re-upload path: apply a revised careplan to the patient's stored one
+    with targeted updates, keeping taken flags and appointment statuses.
+    Falls back to creating the careplan when none is stored yet.
+    """
+    stored = await db[CAREPLANS_COLL].find_one({"patient_id": parsed.get("patient_id")})
+    if not stored:
+        created = await create_careplan(parsed)
+        return {"careplan_id": created["_id"], "created": True, "changes": None}
+
+    ops, changes = diff_careplan(stored, parsed)
+    if ops:
+        # ordered: $push/$pull on an array cannot share an update with $set on it
+        await db[CAREPLANS_COLL].bulk_write(ops, ordered=True)
+    changes["operations"] = len(ops)
+    return {"careplan_id": str(stored["_id"]), "created": False, "changes": changes}
+
+
+async def create_careplans_bulk(careplans: List[dict], batch_size: int = 500) -> List[Optional[str]]:
+    """Insert many careplans with batched, unordered insert_many calls.
+    Returns the inserted id per careplan (None where the insert failed) so a
+    bad document does not abort the rest of the batch.
+    Slot auto-assignment is skipped: bulk loads are historical plans.
+    """
+    ids: List[Optional[str]] = [None] * len(careplans)
+    now = datetime.utcnow()
+    for offset in range(0, len(careplans), batch_size):
+        batch = careplans[offset:offset + batch_size]
+        for cp in batch:
+            cp["created_at"] = now
+        try:
+            res = await db[CAREPLANS_COLL].insert_many(batch, ordered=False)
+            inserted = res.inserted_ids
+            for i, _id in enumerate(inserted):
+                ids[offset + i] = str(_id)
+        except BulkWriteError as e:
+            failed = {err["index"] for err in e.details.get("writeErrors", [])}
+            for i, cp in enumerate(batch):
+                if i not in failed and "_id" in cp:
+                    ids[offset + i] = str(cp["_id"])
+        except Exception as e:
+            # Not a per-document error (network, oversized batch...): retry
+            # this batch one document at a time so the others still land
+            print(f"[careplan] insert_many failed for batch at {offset}: {e}; inserting one by one")
+            for i, cp in enumerate(batch):
+                if "_id" in cp and await db[CAREPLANS_COLL].count_documents({"_id": cp["_id"]}, limit=1):
+                    ids[offset + i] = str(cp["_id"])
+                    continue
+                try:
+                    res = await db[CAREPLANS_COLL].insert_one(cp)
+                    ids[offset + i] = str(res.inserted_id)
+                except Exception as err:
+                    print(f"[careplan] insert failed for document {offset + i}: {err}")
+    for cp, _id in zip(careplans, ids):
+        if _id:
+            cp["_id"] = _id
+    return ids
+
+
 async def get_medication_by_patient(patient_id: str) -> dict:
     doc = await db[CAREPLANS_COLL].find_one({"patient_id": patient_id})
     if not doc:
@@ -77,3 +240,21 @@ async def get_careplan() -> dict:
 
 
 
+
+
+async def get_careplan_by_id(careplan_id: str) -> Optional[dict]:
+    try:
+        oid = ObjectId(careplan_id)
+    except (InvalidId, TypeError):
+        return None
+    doc = await db[CAREPLANS_COLL].find_one({"_id": oid})
+    if not doc:
+        return None
+
+    doc["id"] = str(doc["_id"])
+    doc.pop("_id", None)
+
+    if "created_at" in doc:
+        doc["created_at"] = doc["created_at"].isoformat()
+
+    return doc
@@ -1,22 +1,18 @@
 # app/service/crud_chat.py
-import os
-from openai import OpenAI
-from app.service.crud_careplan import get_careplan
+from typing import Optional
 
-# Initialize OpenRouter GPT client
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENAI_API_KEY_CHATBOT")
-)
+from app.service.careplan_context import CareplanContext, load_careplan_context
+from app.utils.chat_client import chat_completion
 
-async def ask_chatbot(question: str) -> str:
+async def ask_chatbot(question: str, ctx: Optional[CareplanContext] = None) -> str:
     """
-    Fetch the careplan, build a context-aware prompt,
-    and get a response from the LLM (via OpenRouter).
+    Build a context-aware prompt from the request's careplan context
+    (loaded here if the caller has none) and get a response from the LLM
+    (via OpenRouter).
     """
-    # Fetch careplan from DB
-    careplan = await get_careplan()
-    careplan_text = str(careplan) if careplan else "No careplan available"
+    if ctx is None:
+        ctx = await load_careplan_context()
+    careplan_text = ctx.careplan_text
 
     # Build prompt
     prompt = f"""
@@ -31,14 +27,11 @@ User question: {question}
 Answer:
 """
 
-    # Call OpenRouter
-    response = client.chat.completions.create(
-        model="openai/gpt-4o-mini",  # you can swap to another supported model
-        messages=[
+    # Call OpenRouter (shared async client)
+    return await chat_completion(
+        [
             {"role": "system", "content": "You are Greeno, a helpful AI health assistant."},
             {"role": "user", "content": prompt}
         ],
         max_tokens=500
     )
-
-    return response.choices[0].message.content
@@ -0,0 +1,232 @@
+# app/service/crud_ingest_jobs.py
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from ..database import db
+from ..pdf_parser import parse_pdf_with_stats
+from .crud_careplan import insert_careplan, auto_assign_slots, get_careplan_by_id
+
+INGEST_JOBS_COLL = "ingest_jobs"
+INGEST_UPLOADS_BUCKET = "ingest_uploads"
+
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "2"))
+INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "1"))
+# A claimed job is leased to its worker for this many seconds and the
+# worker renews the lease every third of it while the job runs; a job whose
+# lease ran out is assumed lost (worker restart/crash) and goes back to the
+# queue.
+INGEST_JOB_LEASE_SECONDS = int(os.getenv("INGEST_JOB_LEASE_SECONDS", "600"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+
+_uploads = AsyncIOMotorGridFSBucket(db, bucket_name=INGEST_UPLOADS_BUCKET)
+_wakeup = asyncio.Event()
+
+
+async def enqueue_job(filename: str, source, patient_id: str = "1", mode: Optional[str] = None) -> dict:
+    """Store the upload in GridFS and queue a job for it. `source` is a
+    readable binary file object positioned at the start of the upload."""
+    job_id = str(uuid.uuid4())
+    file_id = await _uploads.upload_from_stream(filename, source, metadata={"job_id": job_id})
+    now = datetime.utcnow()
+    job = {
+        "_id": job_id,
+        "status": "queued",
+        "filename": filename,
+        "file_id": file_id,
+        "patient_id": patient_id,
+        "mode": mode,
+        "attempts": 0,
+        "timings": {},
+        "created_at": now,
+        "updated_at": now,
+    }
+    await db[INGEST_JOBS_COLL].insert_one(job)
+    _wakeup.set()
+    return _public(job)
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    doc = await db[INGEST_JOBS_COLL].find_one({"_id": job_id})
+    return _public(doc) if doc else None
+
+
+def _public(job: dict) -> dict:
+    out = {k: v for k, v in job.items() if k not in ("_id", "file_id", "lease_owner", "lease_until")}
+    out["id"] = job["_id"]
+    for k in ("created_at", "updated_at", "started_at", "finished_at"):
+        if isinstance(out.get(k), datetime):
+            out[k] = out[k].isoformat()
+    return out
+
+
+class LeaseLost(Exception):
+    """The job was requeued (lease expired) and now belongs to another worker."""
+
+
+async def _claim_job() -> Optional[dict]:
+    now = datetime.utcnow()
+    return await db[INGEST_JOBS_COLL].find_one_and_update(
+        {"status": "queued"},
+        {"$set": {"status": "running", "stage": "extract", "lease_owner": uuid.uuid4().hex,
+                  "lease_until": now + timedelta(seconds=INGEST_JOB_LEASE_SECONDS),
+                  "started_at": now, "updated_at": now},
+         "$inc": {"attempts": 1}},
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _delete_upload(job: dict) -> None:
+    try:
+        await _uploads.delete(job["file_id"])
+    except Exception as e:
+        print(f"[ingest_jobs] could not delete upload of job {job['_id']}: {e}")
+
+
+async def requeue_stale_jobs() -> int:
+    """Put jobs whose lease ran out back in the queue (or fail them after
+    INGEST_MAX_ATTEMPTS and drop their upload)."""
+    now = datetime.utcnow()
+    stale = {"status": "running", "$or": [
+        {"lease_until": {"$lt": now}},
+        # jobs claimed before leases were recorded
+        {"lease_until": {"$exists": False}, "started_at": {"$lt": now - timedelta(seconds=INGEST_JOB_LEASE_SECONDS)}},
+    ]}
+    async for job in db[INGEST_JOBS_COLL].find({**stale, "attempts": {"$gte": INGEST_MAX_ATTEMPTS}}):
+        res = await db[INGEST_JOBS_COLL].update_one(
+            {"_id": job["_id"], "status": "running", "lease_owner": job.get("lease_owner")},
+            {"$set": {"status": "failed", "stage": None, "error": "worker lost", "updated_at": now},
+             "$unset": {"lease_owner": "", "lease_until": ""}},
+        )
+        if res.modified_count:
+            await _delete_upload(job)
+    res = await db[INGEST_JOBS_COLL].update_many(
+        stale, {"$set": {"status": "queued", "stage": None, "updated_at": now},
+                "$unset": {"lease_owner": "", "lease_until": ""}}
+    )
+    return res.modified_count
+
+
+async def _update(job: dict, fields: dict) -> None:
+    """Update a job this worker holds the lease on; raises LeaseLost if it
+    no longer does."""
+    fields["updated_at"] = datetime.utcnow()
+    res = await db[INGEST_JOBS_COLL].update_one({"_id": job["_id"], "lease_owner": job["lease_owner"]}, {"$set": fields})
+    if res.matched_count == 0:
+        raise LeaseLost(job["_id"])
+
+
+async def _renew_lease(job: dict) -> None:
+    try:
+        while True:
+            await asyncio.sleep(INGEST_JOB_LEASE_SECONDS / 3)
+            await _update(job, {"lease_until": datetime.utcnow() + timedelta(seconds=INGEST_JOB_LEASE_SECONDS)})
+    except LeaseLost:
+        pass
+
+
+async def run_job(job: dict) -> None:
+    """Run one claimed job: extract, parse, insert, slot-assign, recording
+    the current stage and the duration of each stage on the job document.
+    The careplan id is reserved on the job before the insert, so a retried
+    job reuses it (and resumes from slot assignment if the insert landed)
+    instead of inserting a second careplan."""
+    job_id = job["_id"]
+    timings = dict(job.get("timings") or {})
+    extraction = job.get("extraction")
+    heartbeat = asyncio.ensure_future(_renew_lease(job))
+    tmp = None
+    try:
+        careplan = None
+        if job.get("careplan_id"):
+            careplan = await get_careplan_by_id(job["careplan_id"])
+        if careplan is None:
+            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
+            await _uploads.download_to_stream(job["file_id"], tmp)
+            tmp.close()
+
+            loop = asyncio.get_running_loop()
+            parsed, extraction = await loop.run_in_executor(
+                None, parse_pdf_with_stats, tmp.name, job.get("patient_id", "1"), job.get("mode")
+            )
+            timings["extract"] = extraction.pop("extract_s")
+            timings["parse"] = extraction.pop("parse_s")
+            careplan_id = job.get("careplan_id") or str(ObjectId())
+            await _update(job, {"stage": "insert", "timings": timings, "extraction": extraction,
+                                "careplan_id": careplan_id})
+
+            t = time.perf_counter()
+            careplan = await insert_careplan({**parsed.dict(), "_id": ObjectId(careplan_id)})
+            timings["insert"] = round(time.perf_counter() - t, 4)
+        else:
+            careplan["_id"] = careplan.get("id")
+        await _update(job, {"stage": "slot_assign", "timings": timings})
+
+        t = time.perf_counter()
+        await auto_assign_slots(careplan)
+        timings["slot_assign"] = round(time.perf_counter() - t, 4)
+
+        await _update(job, {
+            "status": "done",
+            "stage": None,
+            "timings": timings,
+            "finished_at": datetime.utcnow(),
+            "result": {
+                "careplan_id": careplan["_id"],
+                "medications": len(careplan.get("medications", [])),
+                "appointments": len(careplan.get("appointments", [])),
+                "extraction": extraction,
+            },
+        })
+        await _delete_upload(job)
+    except LeaseLost:
+        print(f"[ingest_jobs] job {job_id} lease lost; left to its new worker")
+    except Exception as e:
+        print(f"[ingest_jobs] job {job_id} failed: {e}")
+        try:
+            await _update(job, {"status": "failed", "stage": None, "error": str(e), "timings": timings,
+                                "finished_at": datetime.utcnow()})
+            await _delete_upload(job)
+        except LeaseLost:
+            pass
+    finally:
+        heartbeat.cancel()
+        if tmp is not None:
+            try:
+                tmp.close()
+                os.unlink(tmp.name)
+            except OSError:
+                pass
+
+
+async def ingest_worker(worker_no: int) -> None:
+    """Background loop: claim queued jobs from Mongo and run them."""
+    while True:
+        try:
+            job = await _claim_job()
+            if job:
+                await run_job(job)
+                continue
+            await requeue_stale_jobs()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[ingest_jobs] worker {worker_no} error: {e}")
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=INGEST_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_ingest_workers() -> List[asyncio.Task]:
+    return [asyncio.create_task(ingest_worker(i)) for i in range(INGEST_JOB_WORKERS)]
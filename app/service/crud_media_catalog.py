@@ -0,0 +1,208 @@
+# app/service/crud_media_catalog.py
+import asyncio
+import difflib
+import json
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set
+
+from ..database import db
+
+# Local catalog of food images and exercise videos, consulted before any
+# Unsplash/YouTube call. Entries come from a curated JSON file
+# ({"food": {"<name>": "<image url>"}, "exercise": {"<name>": "<video url>"}};
+# names still without a URL are skipped until app.utils.curate_media_catalog
+# fills them in) and from API results promoted at runtime; both are kept in Mongo and
+# served from memory. Keys are normalized by the caller (see
+# ai_agent.food_catalog_key / exercise_catalog_key).
+MEDIA_CATALOG_COLL = "media_catalog"
+MEDIA_CATALOG_SEED = os.getenv("MEDIA_CATALOG_SEED", os.path.join(os.path.dirname(__file__), "..", "data", "media_catalog.json"))
+# Near-miss matching is token by token: both keys need the same number of
+# tokens and each token must match one of the other key's tokens with at
+# least this difflib ratio. Tokens shorter than MEDIA_CATALOG_FUZZY_MIN_TOKEN
+# must match exactly ("pear" is not "pea").
+MEDIA_CATALOG_FUZZY_CUTOFF = float(os.getenv("MEDIA_CATALOG_FUZZY_CUTOFF", "0.85"))
+MEDIA_CATALOG_FUZZY_MIN_TOKEN = int(os.getenv("MEDIA_CATALOG_FUZZY_MIN_TOKEN", "5"))
+MEDIA_CATALOG_PROMOTE = os.getenv("MEDIA_CATALOG_PROMOTE", "true").lower() in ("1", "true", "yes")
+# Promoted (API-resolved) entries per kind kept in memory, oldest evicted
+# first, and how long they live in Mongo; curated entries are never evicted.
+MEDIA_CATALOG_MAX_PROMOTED = int(os.getenv("MEDIA_CATALOG_MAX_PROMOTED", "5000"))
+MEDIA_CATALOG_PROMOTED_TTL_SECONDS = int(os.getenv("MEDIA_CATALOG_PROMOTED_TTL_SECONDS", str(90 * 24 * 3600)))
+# Leading characters of a token used to pick fuzzy-match candidates
+_PREFIX_LEN = 3
+
+KINDS = ("food", "exercise")
+
+_entries: Dict[str, Dict[str, str]] = {kind: {} for kind in KINDS}
+_promoted: Dict[str, "OrderedDict[str, None]"] = {kind: OrderedDict() for kind in KINDS}
+# kind -> token prefix -> keys with a token starting with it
+_prefix_index: Dict[str, Dict[str, Set[str]]] = {kind: {} for kind in KINDS}
+_stats: Dict[str, Dict[str, int]] = {kind: {"exact_hits": 0, "fuzzy_hits": 0, "misses": 0, "promoted": 0, "evicted": 0} for kind in KINDS}
+
+
+def _add(kind: str, key: str, url: str) -> None:
+    _entries[kind][key] = url
+    for token in key.split():
+        _prefix_index[kind].setdefault(token[:_PREFIX_LEN], set()).add(key)
+
+
+def _remove(kind: str, key: str) -> None:
+    _entries[kind].pop(key, None)
+    for token in key.split():
+        bucket = _prefix_index[kind].get(token[:_PREFIX_LEN])
+        if bucket is not None:
+            bucket.discard(key)
+
+
+def _tokens_match(query: List[str], candidate: List[str]) -> bool:
+    if len(query) != len(candidate):
+        return False
+    unused = list(candidate)
+    for token in query:
+        best, best_ratio = None, 0.0
+        for other in unused:
+            if token == other:
+                best, best_ratio = other, 1.0
+                break
+            if min(len(token), len(other)) < MEDIA_CATALOG_FUZZY_MIN_TOKEN:
+                continue
+            ratio = difflib.SequenceMatcher(None, token, other).ratio()
+            if ratio > best_ratio:
+                best, best_ratio = other, ratio
+        if best is None or best_ratio < MEDIA_CATALOG_FUZZY_CUTOFF:
+            return False
+        unused.remove(best)
+    return True
+
+
+def _fuzzy(kind: str, key: str) -> Optional[str]:
+    """Closest catalog key that matches `key` token by token. Candidates come
+    from the smallest prefix bucket among the key's tokens, so the work
+    doesn't grow with the catalog."""
+    tokens = key.split()
+    buckets = [_prefix_index[kind].get(t[:_PREFIX_LEN], set()) for t in tokens]
+    if not buckets:
+        return None
+    candidates = min(buckets, key=len)
+    matches = [c for c in candidates if _tokens_match(tokens, c.split())]
+    if not matches:
+        return None
+    return max(matches, key=lambda c: difflib.SequenceMatcher(None, key, c).ratio())
+
+
+def lookup(kind: str, key: str) -> Optional[str]:
+    """URL for `key`, matched exactly or, failing that, to a catalog key
+    whose tokens all match closely (see _tokens_match)."""
+    entries = _entries[kind]
+    url = entries.get(key) if key else None
+    if url:
+        _stats[kind]["exact_hits"] += 1
+        return url
+    close = _fuzzy(kind, key) if key else None
+    if close:
+        _stats[kind]["fuzzy_hits"] += 1
+        return entries[close]
+    _stats[kind]["misses"] += 1
+    return None
+
+
+_background: set = set()
+
+
+async def _store_promoted(kind: str, key: str, name: str, url: str) -> None:
+    now = datetime.utcnow()
+    try:
+        await db[MEDIA_CATALOG_COLL].update_one(
+            {"_id": f"{kind}:{key}"},
+            {"$setOnInsert": {"kind": kind, "key": key, "name": name, "url": url, "source": "promoted",
+                              "created_at": now,
+                              "expires_at": now + timedelta(seconds=MEDIA_CATALOG_PROMOTED_TTL_SECONDS)}},
+            upsert=True,
+        )
+    except Exception as e:
+        print(f"[media_catalog] promote failed for {kind} '{key}': {e}")
+
+
+def _remember_promoted(kind: str, key: str, url: str) -> None:
+    _add(kind, key, url)
+    _promoted[kind][key] = None
+    while len(_promoted[kind]) > MEDIA_CATALOG_MAX_PROMOTED:
+        old, _ = _promoted[kind].popitem(last=False)
+        _remove(kind, old)
+        _stats[kind]["evicted"] += 1
+
+
+async def promote(kind: str, key: str, name: str, url: str) -> None:
+    """Add an API-resolved result to the catalog; curated entries win. The
+    in-memory entry is immediate, the Mongo write runs in the background so
+    it never delays the request that resolved the URL. Promoted entries are
+    capped in memory (MEDIA_CATALOG_MAX_PROMOTED) and expire in Mongo."""
+    if not MEDIA_CATALOG_PROMOTE or not key or key in _entries[kind]:
+        return
+    _remember_promoted(kind, key, url)
+    _stats[kind]["promoted"] += 1
+    task = asyncio.ensure_future(_store_promoted(kind, key, name, url))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+def _read_seed(path: str) -> Dict[str, Dict[str, str]]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"[media_catalog] could not read seed {path}: {e}")
+        return {}
+
+
+async def load_media_catalog(normalizers: Dict[str, Callable[[str], str]]) -> dict:
+    """Load the catalog into memory: curated seed entries (keyed with the
+    given per-kind normalizers and upserted as source "curated"), then
+    everything promoted earlier. Returns entry counts per kind."""
+    seed = _read_seed(MEDIA_CATALOG_SEED)
+    for kind in KINDS:
+        for name, url in (seed.get(kind) or {}).items():
+            key = normalizers[kind](name)
+            if key and url:
+                _add(kind, key, url)
+                try:
+                    await db[MEDIA_CATALOG_COLL].update_one(
+                        {"_id": f"{kind}:{key}"},
+                        {"$set": {"kind": kind, "key": key, "name": name, "url": url, "source": "curated"}},
+                        upsert=True,
+                    )
+                except Exception as e:
+                    print(f"[media_catalog] could not store curated {kind} '{key}': {e}")
+    try:
+        await db[MEDIA_CATALOG_COLL].create_index("expires_at", expireAfterSeconds=0)
+        for kind in KINDS:
+            # newest last, so the most recent promotions survive the cap
+            docs = db[MEDIA_CATALOG_COLL].find(
+                {"kind": kind, "source": "promoted"}, {"key": 1, "url": 1}
+            ).sort("created_at", -1).limit(MEDIA_CATALOG_MAX_PROMOTED)
+            for doc in reversed([d async for d in docs]):
+                if doc["key"] not in _entries[kind]:
+                    _remember_promoted(kind, doc["key"], doc["url"])
+    except Exception as e:
+        print(f"[media_catalog] could not load promoted entries: {e}")
+    return {kind: len(_entries[kind]) for kind in KINDS}
+
+
+def catalog_stats() -> dict:
+    """Per-kind entry counts and hit rates (this process, since start).
+    Every hit is an external lookup that was not made."""
+    out = {}
+    for kind in KINDS:
+        s = _stats[kind]
+        hits = s["exact_hits"] + s["fuzzy_hits"]
+        lookups = hits + s["misses"]
+        out[kind] = {
+            "entries": len(_entries[kind]),
+            "promoted_entries": len(_promoted[kind]),
+            **s,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+        }
+    return out
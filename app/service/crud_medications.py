@@ -1,5 +1,5 @@
 from ..database import db
-from ..utils.ai_agent import get_medicine_reason
+from ..utils.ai_agent import get_medicine_reasons_async
 import uuid
 from bson import ObjectId
 
@@ -49,16 +49,8 @@ async def get_medications_with_info() -> dict:
     if not careplan or "medications" not in careplan:
         return {"medication_info": {}}
 
-    medication_info = {}
-    
-    # Get unique medication names from the careplan
-    for med in careplan["medications"]:
-        medicine_name = med.get("name", "")
-        if medicine_name and medicine_name not in medication_info:
-            try:
-                reason = get_medicine_reason(medicine_name)
-                medication_info[medicine_name] = reason
-            except Exception as e:
-                medication_info[medicine_name] = f"Error getting information: {str(e)}"
+    # All reasons in one batched, cached lookup
+    names = [med.get("name", "") for med in careplan["medications"]]
+    medication_info = await get_medicine_reasons_async(names)
 
-    return {"medication_info": medication_info}
\ No newline at end of file
+    return {"medication_info": medication_info}
@@ -0,0 +1,71 @@
+# app/service/crud_parse_cache.py
+import hashlib
+import os
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+from ..database import db
+
+PARSE_CACHE_COLL = "careplan_parse_cache"
+PARSE_CACHE_MAX_ENTRIES = int(os.getenv("PARSE_CACHE_MAX_ENTRIES", "1000"))
+STATS_ID = "__stats__"
+
+
+def new_fingerprint():
+    """Hasher for the content hash used as the cache key of an uploaded PDF;
+    fed chunk by chunk from the spooled upload."""
+    return hashlib.sha256()
+
+
+async def get_cached_parse(digest: str) -> Optional[dict]:
+    """Return the cache entry for `digest` ({careplan, careplan_id, ...}) or None."""
+    return await db[PARSE_CACHE_COLL].find_one_and_update(
+        {"_id": digest},
+        {"$set": {"last_used": datetime.utcnow()}, "$inc": {"hits": 1}},
+    )
+
+
+async def store_parse(digest: str, careplan: dict, careplan_id: Optional[str]) -> None:
+    """Store a parsed careplan under its content hash, evicting the least
+    recently used entries beyond PARSE_CACHE_MAX_ENTRIES."""
+    now = datetime.utcnow()
+    await db[PARSE_CACHE_COLL].update_one(
+        {"_id": digest},
+        {"$set": {"careplan": careplan, "careplan_id": careplan_id, "last_used": now},
+         "$setOnInsert": {"created_at": now, "hits": 0}},
+        upsert=True,
+    )
+    entries = {"careplan": {"$exists": True}}
+    excess = await db[PARSE_CACHE_COLL].count_documents(entries) - PARSE_CACHE_MAX_ENTRIES
+    if excess > 0:
+        cursor = db[PARSE_CACHE_COLL].find(entries, {"_id": 1}).sort("last_used", 1).limit(excess)
+        stale = [doc["_id"] async for doc in cursor]
+        await db[PARSE_CACHE_COLL].delete_many({"_id": {"$in": stale}})
+
+
+async def link_careplan(digest: str, careplan_id: str) -> None:
+    """Point a cache entry at the careplan document created from it."""
+    await db[PARSE_CACHE_COLL].update_one({"_id": digest}, {"$set": {"careplan_id": careplan_id}})
+
+
+async def record_lookup(hit: bool) -> dict:
+    """Bump the shared hit/miss counters and return them."""
+    doc = await db[PARSE_CACHE_COLL].find_one_and_update(
+        {"_id": STATS_ID},
+        {"$inc": {"hits" if hit else "misses": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return {"hits": doc.get("hits", 0), "misses": doc.get("misses", 0)}
+
+
+def with_fresh_ids(careplan: dict) -> dict:
+    """Copy of a cached careplan with new medication/appointment ids, so a
+    relinked plan never shares ids with the original document."""
+    fresh = dict(careplan)
+    fresh["medications"] = [{**m, "id": str(uuid.uuid4())} for m in careplan.get("medications", [])]
+    fresh["appointments"] = [{**a, "id": str(uuid.uuid4())} for a in careplan.get("appointments", [])]
+    return fresh
@@ -1,93 +1,22 @@
 import os
 import json
-from typing import Any, Dict, List
-from openai import OpenAI
+from typing import Any, Dict, Optional
+from app.utils.chat_client import chat_completion
+from app.service.intent_matcher import match_intent
+from app.service.careplan_context import CareplanContext
 
-# Reuse existing OpenRouter setup – using same env var as crud_chat
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.getenv("OPENAI_API_KEY_CHATBOT")
-)
+# Intent parsing is short and latency-sensitive: fail fast to the chatbot
+PARSE_TIMEOUT = float(os.getenv("INTENT_PARSE_TIMEOUT", "10"))
 
 ALLOWED_TIMES = ["morning", "afternoon", "evening", "night"]
+# Try the local rule-based matcher before asking the LLM
+INTENT_FAST_PATH = os.getenv("INTENT_FAST_PATH", "true").lower() in ("1", "true", "yes")
 
-def _build_appointment_index(careplan: dict) -> Dict[str, Dict[str, Any]]:
-    """Case-insensitive map from an appointment label to its object.
-    Uses 'type' if present, otherwise falls back to id.
-    """
-    appts: Dict[str, Dict[str, Any]] = {}
-    for appt in (careplan or {}).get("appointments", []):
-        label = (appt.get("type") or appt.get("id") or "").strip()
-        if label:
-            appts[label.lower()] = appt
-    return appts
-
-
-def _build_medication_index(careplan: dict) -> Dict[str, Dict[str, Any]]:
-    """Case-insensitive map from medication name to its object."""
-    meds: Dict[str, Dict[str, Any]] = {}
-    for med in (careplan or {}).get("medications", []):
-        name = (med.get("name") or "").strip()
-        if name:
-            meds[name.lower()] = med
-    return meds
-
-
-def parse_instruction(question: str, careplan: dict) -> Dict[str, Any]:
-    """Parse a user instruction into a normalized JSON action.
-    Supported (hackathon scope):
-      - mark_medication
-      - update_appointment (confirm/decline)
-    Returns {"action": "none"} if unrecognized.
-    """
-    medication_index = _build_medication_index(careplan)
-    medication_names: List[str] = list(medication_index.keys())
-    appointment_index = _build_appointment_index(careplan)
-    appointment_labels: List[str] = list(appointment_index.keys())
-
-    system_prompt = (
-        'You are an intent-to-JSON parser for a healthcare careplan assistant. '
-        'You MUST output ONLY valid JSON (no code fences, no explanation). '
-        'Supported intents:\n'
-        '1) Mark a medication as taken/not taken. Output: {"action":"mark_medication","medication_name":"<exact name from list>","time":"<morning|afternoon|evening|night>","taken":true|false}\n'
-        '2) Confirm or decline an appointment. Output: {"action":"update_appointment","appointment_label":"<exact label from list>","status":"confirmed|declined"}\n'
-        'Medication times allowed: morning, afternoon, evening, night (ONLY these).\n'
-        'Rules:\n'
-        "- For appointments: interpret verbs like 'confirm', 'accept' => confirmed; 'decline', 'cancel', 'reject' => declined.\n"
-        '- Use only labels from provided list; if no match, return {"action":"none"}.\n'
-        '- Do NOT hallucinate names.\n'
-        '- Output exactly one JSON object.'
-    )
-
-    user_prompt = (
-        f"Medication names: {medication_names}\n"
-        f"Appointment labels: {appointment_labels}\n"
-        f"User query: {question}\n"
-        "Return JSON now."
-    )
-
-    try:
-        resp = client.chat.completions.create(
-            model="openai/gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            max_tokens=150,
-            temperature=0
-        )
-        raw = resp.choices[0].message.content.strip()
-        first_brace = raw.find("{")
-        last_brace = raw.rfind("}")
-        if first_brace == -1 or last_brace == -1:
-            print(f"[instruction_parser] No JSON braces found in model output: {raw}")
-            return {"action": "none", "reason": "no_json"}
-        raw_json = raw[first_brace:last_brace + 1]
-        parsed = json.loads(raw_json)
-    except Exception as e:
-        print(f"[instruction_parser] LLM parse error: {e}")
-        return {"action": "none", "reason": "parse_error"}
+_stats: Dict[str, int] = {"fast_path": 0, "llm": 0}
 
+def _resolve_action(parsed: Dict[str, Any], medication_index: Dict[str, Dict[str, Any]],
+                    appointment_index: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Validate a raw intent against the careplan indexes and attach ids."""
     action_type = parsed.get("action")
 
     # Medication path
@@ -115,7 +44,6 @@ def parse_instruction(question: str, careplan: dict) -> Dict[str, Any]:
             "time": time_slot,
             "taken": taken
         }
-        print(f"[instruction_parser] Parsed action: {result}")
         return result
 
     # Appointment path
@@ -136,7 +64,93 @@ def parse_instruction(question: str, careplan: dict) -> Dict[str, Any]:
             "appointment_label": appt_obj.get("type") or label,
             "status": status
         }
-        print(f"[instruction_parser] Parsed action: {result}")
         return result
 
     return {"action": "none"}
+
+
+def intent_stats() -> dict:
+    """How many parses the local matcher answered without an LLM call
+    (this process, since start)."""
+    total = _stats["fast_path"] + _stats["llm"]
+    return {**_stats, "fast_path_hit_rate": round(_stats["fast_path"] / total, 4) if total else None}
+
+
+def parse_instruction_locally(question: str, ctx: CareplanContext) -> Optional[Dict[str, Any]]:
+    """Action for an unambiguous command, resolved by the local matcher
+    (intent_matcher) without an LLM call; None when unsure."""
+    if not INTENT_FAST_PATH:
+        return None
+    matched = match_intent(question, ctx.medication_index, ctx.appointment_index)
+    if not matched:
+        return None
+    result = _resolve_action(matched, ctx.medication_index, ctx.appointment_index)
+    if result.get("action") == "none":
+        return None
+    _stats["fast_path"] += 1
+    print(f"[instruction_parser] Parsed action (fast path): {result}")
+    return result
+
+
+async def parse_instruction(question: str, ctx: CareplanContext, try_local: bool = True) -> Dict[str, Any]:
+    """Parse a user instruction into a normalized JSON action.
+    Supported (hackathon scope):
+      - mark_medication
+      - update_appointment (confirm/decline)
+    Returns {"action": "none"} if unrecognized.
+    Unambiguous commands are resolved locally first (unless try_local is
+    False, for callers that already tried); only the rest cost an LLM call.
+    """
+    if try_local:
+        local = parse_instruction_locally(question, ctx)
+        if local:
+            return local
+
+    _stats["llm"] += 1
+
+    system_prompt = (
+        'You are an intent-to-JSON parser for a healthcare careplan assistant. '
+        'You MUST output ONLY valid JSON (no code fences, no explanation). '
+        'Supported intents:\n'
+        '1) Mark a medication as taken/not taken. Output: {"action":"mark_medication","medication_name":"<exact name from list>","time":"<morning|afternoon|evening|night>","taken":true|false}\n'
+        '2) Confirm or decline an appointment. Output: {"action":"update_appointment","appointment_label":"<exact label from list>","status":"confirmed|declined"}\n'
+        'Medication times allowed: morning, afternoon, evening, night (ONLY these).\n'
+        'Rules:\n'
+        "- For appointments: interpret verbs like 'confirm', 'accept' => confirmed; 'decline', 'cancel', 'reject' => declined.\n"
+        '- Use only labels from provided list; if no match, return {"action":"none"}.\n'
+        '- Do NOT hallucinate names.\n'
+        '- Output exactly one JSON object.'
+    )
+
+    user_prompt = (
+        f"Medication names: {ctx.medication_names}\n"
+        f"Appointment labels: {ctx.appointment_labels}\n"
+        f"User query: {question}\n"
+        "Return JSON now."
+    )
+
+    try:
+        raw = (await chat_completion(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            max_tokens=150,
+            temperature=0,
+            timeout=PARSE_TIMEOUT
+        )).strip()
+        first_brace = raw.find("{")
+        last_brace = raw.rfind("}")
+        if first_brace == -1 or last_brace == -1:
+            print(f"[instruction_parser] No JSON braces found in model output: {raw}")
+            return {"action": "none", "reason": "no_json"}
+        raw_json = raw[first_brace:last_brace + 1]
+        parsed = json.loads(raw_json)
+    except Exception as e:
+        print(f"[instruction_parser] LLM parse error: {e}")
+        return {"action": "none", "reason": "parse_error"}
+
+    result = _resolve_action(parsed, ctx.medication_index, ctx.appointment_index)
+    if result.get("action") != "none":
+        print(f"[instruction_parser] Parsed action: {result}")
+    return result
@@ -0,0 +1,147 @@
+# app/service/intent_matcher.py
+import difflib
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Rule-based matcher for the common chat commands ("I took metformin this
+# morning", "confirm the cardiology appointment"). It only answers when the
+# message is an unambiguous command: exactly one target, exactly one
+# polarity and (for medications) one time slot, with no negation or hedge.
+# Anything else returns None and goes to the LLM parser.
+
+NAME_FUZZY_CUTOFF = 0.85
+
+_WORD = re.compile(r"[a-z0-9]+")
+_QUESTION = re.compile(r"^\s*(why|what|when|where|which|who|how|should|can|could|would|do|does|did|is|are|am|will)\b|\?\s*$")
+
+# Only first-person reports ("I took ...", "I haven't taken ...") and
+# explicit "mark ... as (not) taken" commands count; bare verbs like "take"
+# or "had" also appear in requests, plans and symptom reports. Each pattern
+# ends at its verb: the medication has to be the verb's object (see
+# _object_is), so "I skipped breakfast but took my metformin" is not a
+# report about metformin.
+_MED_POSITIVE = re.compile(
+    r"\bi\s+(?:just\s+|already\s+)?took\b|\bi(?:'ve|\s+have)\s+(?:just\s+|already\s+)?taken\b"
+    r"|^(?:just\s+)?took\b|^(?:please\s+)?mark\b(?=.*\bas\s+taken\b)"
+)
+_MED_NEGATIVE = re.compile(
+    r"\bi\s+(?:didn'?t|did\s+not|haven'?t|have\s+not|never)\s+(?:take|taken|took)\b"
+    r"|\b(?:i\s+)?(?:missed|skipped|forgot\s+to\s+take|forgot)\b"
+    r"|^(?:please\s+)?mark\b(?=.*\bas\s+not\s+taken\b)|^(?:please\s+)?unmark\b"
+)
+# Words allowed between a verb and its object ("took my morning dose of ...")
+_MED_OBJECT_FILLER = {"my", "the", "a", "an", "this", "today", "s", "morning", "afternoon", "evening",
+                      "night", "tonight", "bedtime", "dose", "of"}
+# Negated commands, requests, plans, doubts and symptom reports: never
+# write anything for these locally
+_HEDGE = re.compile(
+    r"\b(?:don'?t|do\s+not|remind|need|want|going\s+to|gonna|will|whether|if|should|wonder"
+    r"|reaction|side\s+effects?|allerg\w*|sick|pain|dizzy|nause\w*)\b"
+)
+_TIME_SLOTS = {
+    "morning": re.compile(r"\b(morning|breakfast)\b"),
+    "afternoon": re.compile(r"\b(afternoon|lunch|noon|midday)\b"),
+    "evening": re.compile(r"\b(evening|dinner|supper)\b"),
+    "night": re.compile(r"\b(night|tonight|bedtime|bed)\b"),
+}
+
+# Imperatives ("confirm the ...") or first-person statements only, so
+# "I booked a taxi for the cardiology appointment" is not a confirmation.
+# As for medications, the appointment has to be the verb's object:
+# "cancel my ride to the cardiology appointment" is not a decline.
+_APPT_CONFIRM = re.compile(
+    r"^(?:please\s+|yes,?\s+|ok,?\s+)?(?:confirm|accept|approve)\b"
+    r"|\bi\s+(?:confirm|accept)\b|\bi'?ll\s+(?:be\s+there\s+for|attend)\b"
+)
+_APPT_DECLINE = re.compile(
+    r"^(?:please\s+)?(?:decline|cancel|reject)\b"
+    r"|\bi\s+(?:decline|cancel|reject)\b|\bi\s+(?:can'?t|cannot)\s+(?:make|attend|come\s+to)\b"
+)
+_APPT_NOISE = {"appointment", "appt", "visit", "follow", "up", "followup", "with", "the", "dr", "doctor", "session", "check", "checkup"}
+_APPT_OBJECT_FILLER = _APPT_NOISE | {"my", "a", "an", "this", "that", "next", "upcoming", "today", "tomorrow", "s"}
+
+
+def _tokens(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def _fuzzy_in(token: str, words: List[str]) -> bool:
+    return token in words or bool(difflib.get_close_matches(token, words, n=1, cutoff=NAME_FUZZY_CUTOFF))
+
+
+def _matches(name_tokens: List[str], words: List[str]) -> bool:
+    return bool(name_tokens) and all(_fuzzy_in(t, words) for t in name_tokens)
+
+
+def _object_is(verb: re.Pattern, text: str, name_tokens: List[str], filler: Set[str]) -> bool:
+    """Whether some match of `verb` is directly followed (past filler words)
+    by the name."""
+    for m in verb.finditer(text):
+        words = _tokens(text[m.end():])
+        i = 0
+        while i < len(words) and words[i] in filler:
+            i += 1
+        if _matches(name_tokens, words[i:i + len(name_tokens)]):
+            return True
+    return False
+
+
+def _one(found: List[Tuple[str, Any]]) -> Optional[Tuple[str, Any]]:
+    return found[0] if len(found) == 1 else None
+
+
+def _time_slot(text: str, med: Dict[str, Any]) -> Optional[str]:
+    slots = [slot for slot, rx in _TIME_SLOTS.items() if rx.search(text)]
+    if len(slots) == 1:
+        return slots[0]
+    if not slots:
+        # No time given: fine if the medication is only scheduled once a day
+        scheduled = [s.get("time") for s in med.get("schedule", []) if s.get("time")]
+        if len(scheduled) == 1:
+            return scheduled[0]
+    return None
+
+
+def _medication_intent(text: str, words: List[str], medication_index: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    meds = [(name, med) for name, med in medication_index.items() if _matches(_tokens(name), words)]
+    match = _one(meds)
+    if not match:
+        return None
+    name_tokens = _tokens(match[0])
+    negative = _object_is(_MED_NEGATIVE, text, name_tokens, _MED_OBJECT_FILLER)
+    positive = _object_is(_MED_POSITIVE, text, name_tokens, _MED_OBJECT_FILLER)
+    if negative == positive:
+        return None
+    time_slot = _time_slot(text, match[1])
+    if not time_slot:
+        return None
+    return {"action": "mark_medication", "medication_name": match[0], "time": time_slot, "taken": not negative}
+
+
+def _appointment_intent(text: str, words: List[str], appointment_index: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    appts = [(label, appt) for label, appt in appointment_index.items()
+             if _matches([t for t in _tokens(label) if t not in _APPT_NOISE], words)]
+    match = _one(appts)
+    if not match:
+        return None
+    label_tokens = [t for t in _tokens(match[0]) if t not in _APPT_NOISE]
+    confirm = _object_is(_APPT_CONFIRM, text, label_tokens, _APPT_OBJECT_FILLER)
+    decline = _object_is(_APPT_DECLINE, text, label_tokens, _APPT_OBJECT_FILLER)
+    if confirm == decline:
+        return None
+    return {"action": "update_appointment", "appointment_label": match[0], "status": "confirmed" if confirm else "declined"}
+
+
+def match_intent(question: str, medication_index: Dict[str, Dict[str, Any]],
+                 appointment_index: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Raw intent ({"action", "medication_name"/"appointment_label", ...},
+    names as index keys) for a high-confidence command, else None."""
+    text = question.lower().strip()
+    if not text or _QUESTION.search(text) or _HEDGE.search(text):
+        return None
+    words = _tokens(text)
+    med = _medication_intent(text, words, medication_index)
+    appt = _appointment_intent(text, words, appointment_index)
+    if med and appt:
+        return None
+    return med or appt
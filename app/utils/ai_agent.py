@@ -1,5 +1,7 @@
 from ..service.crud_doctor_availabilty import get_doctor_by_specialty
 from ..database import db
+from ..service.crud_cache import TwoTierCache
+from ..service import crud_media_catalog as media_catalog
 
 CAREPLANS_COLL = "careplans"
 
@@ -36,50 +38,207 @@ async def assign_slot_to_appointment(patient_id: str, appointment_id: str, speci
 
 from dotenv import load_dotenv
 load_dotenv()
+import asyncio
+import hashlib
 import os
-import requests
+import httpx
 import json
 import re
-from datetime import date
 from typing import Dict, List, Optional
 from fastapi import HTTPException
+from app.utils.section_index import SectionIndexer
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_MODEL = "openai/gpt-4o-mini"
 UNSPLASH_API_KEY = os.getenv("UNSPLASH_API_KEY")
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
 
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+UNSPLASH_SEARCH_URL = "https://api.unsplash.com/search/photos"
+YOUTUBE_SEARCH_URL = "https://www.googleapis.com/youtube/v3/search"
+
+# Per-call timeouts (seconds)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+UNSPLASH_TIMEOUT = float(os.getenv("UNSPLASH_TIMEOUT", "8"))
+YOUTUBE_TIMEOUT = float(os.getenv("YOUTUBE_TIMEOUT", "10"))
+
+# Max in-flight requests per upstream host on the shared async client
+HOST_CONCURRENCY = {
+    "openrouter.ai": int(os.getenv("OPENROUTER_CONCURRENCY", "8")),
+    "api.unsplash.com": int(os.getenv("UNSPLASH_CONCURRENCY", "4")),
+    "www.googleapis.com": int(os.getenv("YOUTUBE_CONCURRENCY", "4")),
+}
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "32"))
+
+# Query variants issued at once by the async image/video lookups; the first
+# relevant result wins and the rest are cancelled. Every variant sent costs
+# API quota (a YouTube search is 100 units), so keep these small.
+UNSPLASH_HEDGE_WIDTH = int(os.getenv("UNSPLASH_HEDGE_WIDTH", "2"))
+YOUTUBE_HEDGE_WIDTH = int(os.getenv("YOUTUBE_HEDGE_WIDTH", "2"))
+
 # Image helper constants/cache
 PLACEHOLDER_IMAGE = "https://images.unsplash.com/photo-1506806732259-39c2d0268443?w=640&auto=format&fit=crop&q=60"  # generic healthy food
-FOOD_IMAGE_CACHE: dict[str, str] = {}
+# Food name -> image URL. In-process LRU backed by a shared Mongo collection;
+# placeholder results expire quickly so a transient Unsplash failure or a
+# missing key is retried soon instead of sticking for weeks.
+FOOD_IMAGE_CACHE_MAX_ENTRIES = int(os.getenv("FOOD_IMAGE_CACHE_MAX_ENTRIES", "512"))
+FOOD_IMAGE_TTL_SECONDS = int(os.getenv("FOOD_IMAGE_TTL_SECONDS", str(30 * 24 * 3600)))
+PLACEHOLDER_IMAGE_TTL_SECONDS = int(os.getenv("PLACEHOLDER_IMAGE_TTL_SECONDS", "3600"))
+FOOD_IMAGE_CACHE = TwoTierCache("food_image_cache", FOOD_IMAGE_CACHE_MAX_ENTRIES)
+
+# LLM responses keyed by a hash of the request payload (model, system and user
+# prompt). Each call site passes its own TTL; fresh=True bypasses the cache.
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2048"))
+LLM_CACHE_TTLS = {
+    "default": int(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 3600))),
+    "entities": int(os.getenv("LLM_CACHE_TTL_ENTITIES", str(7 * 24 * 3600))),
+    "descriptive_terms": int(os.getenv("LLM_CACHE_TTL_DESCRIPTIVE_TERMS", str(30 * 24 * 3600))),
+    "alt_foods": int(os.getenv("LLM_CACHE_TTL_ALT_FOODS", str(7 * 24 * 3600))),
+    "medicine_reason": int(os.getenv("LLM_CACHE_TTL_MEDICINE_REASON", str(30 * 24 * 3600))),
+}
+LLM_CACHE = TwoTierCache("llm_response_cache", LLM_CACHE_MAX_ENTRIES)
+
+# Medicine name (lowercased) -> prescription reason, filled by batched lookups
+MEDICINE_REASON_CACHE = TwoTierCache("medicine_reason_cache", int(os.getenv("MEDICINE_REASON_CACHE_MAX_ENTRIES", "1024")))
+MEDICINE_REASON_BATCH_SIZE = int(os.getenv("MEDICINE_REASON_BATCH_SIZE", "25"))
+
+# ---------------------------------------------------------------------------
+# HTTP client: one pooled httpx.AsyncClient, opened/closed by the app lifespan.
+# ---------------------------------------------------------------------------
+_async_client: Optional[httpx.AsyncClient] = None
+_host_limits: Dict[str, asyncio.Semaphore] = {}
+
+
+async def start_http_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+            timeout=LLM_TIMEOUT,
+        )
+        _host_limits.clear()
+        _host_limits.update({host: asyncio.Semaphore(n) for host, n in HOST_CONCURRENCY.items()})
+    return _async_client
+
+
+async def close_http_client() -> None:
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+async def _async_request(method: str, url: str, timeout: float, **kwargs) -> httpx.Response:
+    """Send through the shared client, holding the per-host concurrency slot."""
+    client = await start_http_client()
+    limit = _host_limits.get(httpx.URL(url).host)
+    if limit is None:
+        return await client.request(method, url, timeout=timeout, **kwargs)
+    async with limit:
+        return await client.request(method, url, timeout=timeout, **kwargs)
 
-def call_openrouter_api(prompt: str, system_prompt: Optional[str] = None) -> str:
-    headers = {
+
+def _openrouter_headers() -> Dict[str, str]:
+    return {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json"
     }
+
+
+def _openrouter_payload(prompt: str, system_prompt: Optional[str] = None, model: str = OPENROUTER_MODEL) -> dict:
     data = {
-        "model": OPENROUTER_MODEL,
+        "model": model,
         "messages": []
     }
     if system_prompt:
         data["messages"].append({"role": "system", "content": system_prompt})
     data["messages"].append({"role": "user", "content": prompt})
-    response = requests.post("https://openrouter.ai/api/v1/chat/completions", headers=headers, json=data)
+    return data
+
+
+def _llm_cache_key(payload: dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _cacheable(content: str, expect_json: bool) -> bool:
+    if not expect_json:
+        return bool(content)
+    try:
+        json.loads(content)
+        return True
+    except json.JSONDecodeError:
+        return False
+
+
+async def call_openrouter_api_async(prompt: str, system_prompt: Optional[str] = None, model: str = OPENROUTER_MODEL,
+                                    cache_ttl: float = LLM_CACHE_TTLS["default"], fresh: bool = False, expect_json: bool = False) -> str:
+    payload = _openrouter_payload(prompt, system_prompt, model)
+    use_cache = LLM_CACHE_ENABLED and not fresh
+    if use_cache:
+        key = _llm_cache_key(payload)
+        cached = await LLM_CACHE.get(key)
+        if cached is not None:
+            return cached
+    response = await _async_request("POST", OPENROUTER_URL, LLM_TIMEOUT, headers=_openrouter_headers(), json=payload)
     if response.status_code == 200:
-        return response.json()["choices"][0]["message"]["content"]
+        content = response.json()["choices"][0]["message"]["content"]
+        if use_cache and _cacheable(content, expect_json):
+            await LLM_CACHE.set(key, content, cache_ttl)
+        return content
     else:
         raise ValueError(f"OpenRouter API error: {response.text}")
-    
-def fetch_food_image(food_name: str) -> str:
-    original_name = food_name
-    if not food_name:
-        return PLACEHOLDER_IMAGE
 
-    cached = FOOD_IMAGE_CACHE.get(original_name.lower())
-    if cached:
-        return cached
 
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _stem(token: str) -> str:
+    # Plural folding only ("legs" ~ "leg", "berries" ~ "berry"), keeping "fitness"
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def _token_set(text: str) -> frozenset:
+    """Lowercased, plural-folded word tokens of `text`."""
+    return frozenset(_stem(t) for t in _WORD.findall(text.lower()))
+
+
+async def _first_match(candidates: List[str], lookup, width: int) -> Optional[str]:
+    """Run lookup(candidate) with up to `width` in flight, starting the next
+    candidate whenever one comes back empty. Returns the first truthy result
+    to arrive (not necessarily the earliest candidate) and cancels the rest;
+    a lookup that raises counts as empty."""
+    remaining = iter(candidates)
+    pending = set()
+
+    def launch() -> None:
+        for candidate in remaining:
+            pending.add(asyncio.ensure_future(lookup(candidate)))
+            return
+
+    try:
+        for _ in range(max(1, width)):
+            launch()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = None if task.exception() else task.result()
+                if result:
+                    return result
+                launch()
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def normalize_food_name(food_name: str) -> str:
+    """Core, image-searchable phrase for a food: parentheticals, punctuation
+    and cooking methods removed, complex dishes mapped to a simpler phrase."""
     # Normalize and simplify
     cleaned = re.sub(r"\([^)]*\)", "", food_name).strip()
     cleaned = re.sub(r"[.,!?]", "", cleaned).strip()
@@ -113,7 +272,12 @@ def fetch_food_image(food_name: str) -> str:
         "banana": "banana",
         "bananas": "banana",
     }
-    core = map_overrides.get(cleaned_lower, cleaned_lower)
+    return map_overrides.get(cleaned_lower, cleaned_lower)
+
+
+def _food_image_queries(food_name: str) -> List[str]:
+    """Unsplash query variants for a food, ordered most specific to general."""
+    core = normalize_food_name(food_name)
 
     # Build query variants (ordered most specific to general)
     queries: list[str] = []
@@ -132,131 +296,217 @@ def fetch_food_image(food_name: str) -> str:
         if q and q not in seen:
             seen.add(q)
             final_queries.append(q)
+    return final_queries
 
-    def unsplash_search(query: str) -> Optional[str]:
-        # Unsplash API: GET https://api.unsplash.com/search/photos?query=...&per_page=...
-        url = f"https://api.unsplash.com/search/photos?query={requests.utils.quote(query)}&per_page=20&content_filter=high"
-        headers = {"Authorization": f"Client-ID {UNSPLASH_API_KEY}"}
-        try:
-            r = requests.get(url, headers=headers, timeout=8)
-            if r.status_code != 200:
-                print(f"[unsplash] HTTP {r.status_code} for query='{query}'")
-                return None
-            data = r.json()
-            results = data.get("results", [])
-            print(f"[unsplash] query='{query}' hits={len(results)}")
-            for res in results:
-                alt = (res.get("alt_description") or "").lower()
-                # Basic relevance heuristics
-                if any(tok in alt for tok in query.split()[:2]) or any(k in alt for k in ["food","dish","meal","bowl","plate","healthy","fresh","cooked","breakfast","lunch","dinner"]):
-                    urls = res.get("urls", {})
-                    chosen = urls.get("small") or urls.get("regular") or urls.get("thumb")
-                    if chosen:
-                        return chosen
-        except Exception as e:
-            print(f"[unsplash] error query='{query}': {e}")
+
+FOOD_FALLBACK_QUERIES = ["healthy food bowl", "healthy meal"]
+FOOD_IMAGE_WORDS = _token_set("food dish meal bowl plate healthy fresh cooked breakfast lunch dinner")
+# Presentation words dropped from catalog keys ("oatmeal bowl" ~ "oatmeal")
+_FOOD_KEY_NOISE = _token_set("food dish meal bowl plate")
+_EXERCISE_KEY_NOISE = _token_set("exercise workout routine gentle light daily session")
+
+
+def food_catalog_key(food_name: str) -> str:
+    """Order-insensitive media catalog key for a food."""
+    return " ".join(sorted(_token_set(normalize_food_name(food_name)) - _FOOD_KEY_NOISE))
+
+
+def exercise_catalog_key(exercise_name: str) -> str:
+    return " ".join(sorted(_token_set(exercise_name) - _EXERCISE_KEY_NOISE))
+
+
+def _unsplash_request(query: str) -> dict:
+    # Unsplash API: GET https://api.unsplash.com/search/photos?query=...&per_page=...
+    return {
+        "params": {"query": query, "per_page": 20, "content_filter": "high"},
+        "headers": {"Authorization": f"Client-ID {UNSPLASH_API_KEY}"},
+    }
+
+
+def _pick_unsplash_image(query: str, status_code: int, data: Optional[dict]) -> Optional[str]:
+    if status_code != 200:
+        print(f"[unsplash] HTTP {status_code} for query='{query}'")
         return None
+    results = (data or {}).get("results", [])
+    print(f"[unsplash] query='{query}' hits={len(results)}")
+    # Basic relevance heuristics: the alt text shares a word with the first
+    # two query words or with the generic food vocabulary
+    wanted = _token_set(" ".join(query.split()[:2])) | FOOD_IMAGE_WORDS
+    for res in results:
+        if not wanted.isdisjoint(_token_set(res.get("alt_description") or "")):
+            urls = res.get("urls", {})
+            chosen = urls.get("small") or urls.get("regular") or urls.get("thumb")
+            if chosen:
+                return chosen
+    return None
 
-    for q in final_queries:
-        img = unsplash_search(q)
-        if img:
-            FOOD_IMAGE_CACHE[original_name.lower()] = img
-            return img
 
-    # Generic fallback attempt
-    generic = unsplash_search("healthy food bowl") or unsplash_search("healthy meal")
-    if generic:
-        FOOD_IMAGE_CACHE[original_name.lower()] = generic
-        return generic
+async def unsplash_search_async(query: str) -> Optional[str]:
+    try:
+        r = await _async_request("GET", UNSPLASH_SEARCH_URL, UNSPLASH_TIMEOUT, **_unsplash_request(query))
+        return _pick_unsplash_image(query, r.status_code, r.json() if r.status_code == 200 else None)
+    except Exception as e:
+        print(f"[unsplash] error query='{query}': {e}")
+    return None
+
 
-    FOOD_IMAGE_CACHE[original_name.lower()] = PLACEHOLDER_IMAGE
+async def fetch_food_image_async(food_name: str) -> str:
+    original_name = food_name
+    if not food_name:
+        return PLACEHOLDER_IMAGE
+
+    catalog_key = food_catalog_key(food_name)
+    curated = media_catalog.lookup("food", catalog_key)
+    if curated:
+        return curated
+
+    cached = await FOOD_IMAGE_CACHE.get(original_name.lower())
+    if cached:
+        return cached
+
+    final_queries = _food_image_queries(food_name)
+    img = await _first_match(final_queries, unsplash_search_async, UNSPLASH_HEDGE_WIDTH)
+    if img:
+        await FOOD_IMAGE_CACHE.set(original_name.lower(), img, FOOD_IMAGE_TTL_SECONDS)
+        await media_catalog.promote("food", catalog_key, original_name, img)
+        return img
+    # Generic fallbacks only once every specific variant has come back empty
+    # (never promoted: they don't show the food itself)
+    img = await _first_match(FOOD_FALLBACK_QUERIES, unsplash_search_async, UNSPLASH_HEDGE_WIDTH)
+    if img:
+        await FOOD_IMAGE_CACHE.set(original_name.lower(), img, FOOD_IMAGE_TTL_SECONDS)
+        return img
+
+    await FOOD_IMAGE_CACHE.set(original_name.lower(), PLACEHOLDER_IMAGE, PLACEHOLDER_IMAGE_TTL_SECONDS)
     print(f"[unsplash] placeholder used for '{original_name}' queries={final_queries}")
     return PLACEHOLDER_IMAGE
 
-def extract_descriptive_terms(description: str) -> str:
-    system_prompt = """You are an assistant that extracts key descriptive terms for exercise video searches. Given an exercise description, return a single string with 1-3 concise terms (space-separated) that capture the specific focus of the exercise, excluding the exercise name, generic words like 'exercises', 'focusing', or durations (e.g., '30 minutes'). Example: For 'Gentle stretching exercises focusing on the legs and knees', return 'gentle leg knee'. Return only the terms, no JSON or extra text."""
+
+DESCRIPTIVE_TERMS_PROMPT = """You are an assistant that extracts key descriptive terms for exercise video searches. Given an exercise description, return a single string with 1-3 concise terms (space-separated) that capture the specific focus of the exercise, excluding the exercise name, generic words like 'exercises', 'focusing', or durations (e.g., '30 minutes'). Example: For 'Gentle stretching exercises focusing on the legs and knees', return 'gentle leg knee'. Return only the terms, no JSON or extra text."""
+
+
+def _fallback_descriptive_terms(description: str) -> str:
+    # Fallback to basic extraction
+    words = description.lower().split()
+    exclude = {'exercises', 'focusing', 'for', 'on', 'and', 'to', 'with', 'minutes', 'seconds'}
+    terms = [word for word in words if word not in exclude and not word.isdigit()][:3]
+    return ' '.join(terms) or 'exercise'
+
+
+async def extract_descriptive_terms_async(description: str) -> str:
     prompt = f"Description: {description}"
     try:
-        terms = call_openrouter_api(prompt, system_prompt)
+        terms = await call_openrouter_api_async(prompt, DESCRIPTIVE_TERMS_PROMPT, cache_ttl=LLM_CACHE_TTLS["descriptive_terms"])
         return terms.strip()
     except Exception as e:
         print(f"OpenRouter terms extraction error: {e}")
-        # Fallback to basic extraction
-        words = description.lower().split()
-        exclude = {'exercises', 'focusing', 'for', 'on', 'and', 'to', 'with', 'minutes', 'seconds'}
-        terms = [word for word in words if word not in exclude and not word.isdigit()][:3]
-        return ' '.join(terms) or 'exercise'
-    
-def fetch_exercise_video(exercise_name: str, description: str) -> str:
-    descriptive_terms = extract_descriptive_terms(description)
-    
+        return _fallback_descriptive_terms(description)
+
+
+def _youtube_queries(exercise_name: str) -> List[str]:
     # Try multiple search strategies, prioritizing exact matches
-    search_queries = [
+    return [
         f"{exercise_name} exercise tutorial",
         f"{exercise_name} workout",
         f"how to do {exercise_name}",
         f"{exercise_name} exercise",
         f"{exercise_name} fitness"
     ]
-    
-    try:
-        for query in search_queries:
-            url = f"https://www.googleapis.com/youtube/v3/search?part=snippet&q={requests.utils.quote(query)}&key={YOUTUBE_API_KEY}&type=video&videoCategoryId=17&maxResults=15"
-            response = requests.get(url, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('items'):
-                    for item in data['items']:
-                        title = item['snippet']['title'].lower()
-                        desc = item['snippet']['description'].lower()
-                        
-                        # Skip irrelevant content
-                        if any(term in title + desc for term in ['cartoon', 'anime', 'meme', 'game', 'animation', 'music', 'song', 'comedy', 'funny']):
-                            continue
-                        
-                        # Prioritize videos that mention the specific exercise name
-                        if exercise_name.lower() in title:
-                            # Additional check for exercise-related content
-                            if any(term in title + desc for term in ['exercise', 'workout', 'fitness', 'training', 'tutorial', 'how to', 'demonstration', 'form']):
-                                video_id = item['id']['videoId']
-                                return f"https://www.youtube.com/watch?v={video_id}"
-                        
-                        # Secondary option: exercise-related with descriptive terms
-                        elif (any(term in title for term in descriptive_terms.split() if term) and 
-                              any(term in title + desc for term in ['exercise', 'workout', 'fitness', 'training', 'tutorial'])):
-                            video_id = item['id']['videoId']
-                            return f"https://www.youtube.com/watch?v={video_id}"
-        
-        # If no specific match found, return None to skip this exercise
+
+
+def _youtube_params(query: str) -> dict:
+    return {"part": "snippet", "q": query, "key": YOUTUBE_API_KEY, "type": "video", "videoCategoryId": 17, "maxResults": 15}
+
+
+VIDEO_BLOCKLIST = _token_set("cartoon anime meme game gaming animation animated music song comedy funny")
+VIDEO_EXERCISE_WORDS = _token_set("exercise workout fitness training tutorial demonstration form")
+VIDEO_TUTORIAL_WORDS = _token_set("exercise workout fitness training tutorial")
+
+
+class VideoMatcher:
+    """Relevance check for YouTube results, built once per exercise and
+    applied to every search result as token-set intersections."""
+
+    def __init__(self, exercise_name: str, descriptive_terms: str):
+        self.name_tokens = _token_set(exercise_name)
+        self.term_tokens = _token_set(descriptive_terms)
+
+    def pick(self, data: dict) -> Optional[str]:
+        for item in data.get('items') or []:
+            title = _token_set(item['snippet']['title'])
+            text = title | _token_set(item['snippet']['description'])
+
+            # Skip irrelevant content
+            if not VIDEO_BLOCKLIST.isdisjoint(text):
+                continue
+
+            # Prioritize videos that mention the specific exercise name
+            if self.name_tokens and self.name_tokens <= title:
+                # Additional check for exercise-related content
+                if not VIDEO_EXERCISE_WORDS.isdisjoint(text) or {"how", "to"} <= text:
+                    return f"https://www.youtube.com/watch?v={item['id']['videoId']}"
+
+            # Secondary option: exercise-related with descriptive terms
+            elif not self.term_tokens.isdisjoint(title) and not VIDEO_TUTORIAL_WORDS.isdisjoint(text):
+                return f"https://www.youtube.com/watch?v={item['id']['videoId']}"
         return None
-    except Exception as e:
-        print(f"YouTube API error: {e}")
+
+
+async def fetch_exercise_video_async(exercise_name: str, description: str) -> Optional[str]:
+    catalog_key = exercise_catalog_key(exercise_name)
+    curated = media_catalog.lookup("exercise", catalog_key)
+    if curated:
+        return curated
+
+    matcher = VideoMatcher(exercise_name, await extract_descriptive_terms_async(description))
+
+    async def search(query: str) -> Optional[str]:
+        try:
+            response = await _async_request("GET", YOUTUBE_SEARCH_URL, YOUTUBE_TIMEOUT, params=_youtube_params(query))
+            if response.status_code == 200:
+                return matcher.pick(response.json())
+        except Exception as e:
+            print(f"YouTube API error: {e}")
         return None
 
+    video = await _first_match(_youtube_queries(exercise_name), search, YOUTUBE_HEDGE_WIDTH)
+    if video:
+        await media_catalog.promote("exercise", catalog_key, exercise_name, video)
+    # If no specific match found, return None to skip this exercise
+    return video
+
+# Compiled once; a single scan of the medical history finds every heading.
+# A section runs until the next "Label:" line, as before.
+HISTORY_SECTIONS = SectionIndexer(
+    {
+        'history': r'(?:Medical |Patient )History:?',
+        'concern': r'(?:Patient |Chief )Concern[s]?:?',
+        'current_diet': r'(?:Current |Patient )Diet:?',
+        'lab_reports': r'(?:Lab |Laboratory |Test )Report[s]?:?',
+        'allergies': r'(?:Allergies|Food Allergies):?',
+    },
+    boundary=r'\n(?=[A-Z][a-z]+:)',
+    flags=re.DOTALL | re.IGNORECASE,
+)
+
 def parse_sections(text: str) -> Dict[str, str]:
-    sections = {'history': '', 'concern': '', 'current_diet': '', 'lab_reports': '', 'allergies': ''}
-    patterns = [
-        ('history', r'(?:Medical |Patient )History:?\s*(.*?)(?=\n[A-Z][a-z]+:|\Z)'),
-        ('concern', r'(?:Patient |Chief )Concern[s]?:?\s*(.*?)(?=\n[A-Z][a-z]+:|\Z)'),
-        ('current_diet', r'(?:Current |Patient )Diet:?\s*(.*?)(?=\n[A-Z][a-z]+:|\Z)'),
-        ('lab_reports', r'(?:Lab |Laboratory |Test )Report[s]?:?\s*(.*?)(?=\n[A-Z][a-z]+:|\Z)'),
-        ('allergies', r'(?:Allergies|Food Allergies):?\s*(.*?)(?=\n[A-Z][a-z]+:|\Z)')
-    ]
-    for key, pattern in patterns:
-        match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
-        sections[key] = match.group(1).strip() if match else ''
-    return sections
+    index = HISTORY_SECTIONS.index(text)
+    return {key: index.section(key, until=()) for key in HISTORY_SECTIONS.keys}
 
-def extract_entities(text: str, lab_reports: str, allergies: str) -> Dict:
-    system_prompt = """You are a medical AI assistant. Extract information from the provided medical text, lab reports (if any), and allergies (if any) and return a valid JSON object only, no extra text or code blocks, that can be parsed by json.loads, with:
+ENTITIES_PROMPT = """You are a medical AI assistant. Extract information from the provided medical text, lab reports (if any), and allergies (if any) and return a valid JSON object only, no extra text or code blocks, that can be parsed by json.loads, with:
 - 'conditions': List of conditions/diseases from history, concern, or lab reports (e.g., 'low iron' from lab reports).
 - 'concern': Main patient concern or symptom (e.g., 'high blood sugar').
 - 'lab_metrics': List of key lab results (e.g., ['low hemoglobin', 'high cholesterol']) or empty list if none.
 - 'allergies': List of food allergies (e.g., ['peanuts', 'shellfish']) or empty list if none.
-- Today is {today}.
 Return valid JSON only, nothing else."""
+
+
+def _entities_prompts(text: str, lab_reports: str, allergies: str) -> tuple:
     prompt = f"Medical text: {text}\nLab reports: {lab_reports or 'None'}\nAllergies: {allergies or 'None'}"
-    response = call_openrouter_api(prompt, system_prompt.format(today=date.today().strftime('%Y-%m-%d')))
+    return prompt, ENTITIES_PROMPT
+
+
+def _parse_entities(response: str) -> Dict:
     try:
         data = json.loads(response)
     except json.JSONDecodeError as e:
@@ -266,21 +516,13 @@ Return valid JSON only, nothing else."""
         'conditions': [], 'concern': '', 'lab_metrics': [], 'allergies': []
     }
 
-def analyze_current_diet(current_diet: str, conditions: List[str], concern: str, lab_metrics: List[str], allergies: List[str]) -> str:
-    if not current_diet.strip():
-        return ""
-    
-    # Clean parenthetical notes (e.g., "dessert (gulab jamun)" -> "gulab jamun")
-    current_diet = re.sub(r'\([^)]*\)', lambda m: m.group(0).strip('()'), current_diet)
-    
-    # Parse foods, splitting on meal labels, conjunctions, commas, semicolons, periods
-    foods = [food.strip() for food in re.split(r'[,\s;]+and\s*|[,\s;]+|[:\n]+|with\s+|[.]', current_diet) 
-             if food.strip() and not food.lower() in ['breakfast', 'lunch', 'dinner', 'snacks', 'evening', 'morning', 'dessert']]
-    foods = list(dict.fromkeys(foods))  # Remove duplicates
-    if not foods:
-        return "In your current diet, no specific foods were identified. Adopting healthier options can enhance your well-being."
-    
-    system_prompt = """You are a medical AI assistant. Given the patient's current diet (list of foods), medical conditions, concern, lab metrics (if any), and allergies (if any), analyze each food to determine its healthiness based on its nutritional content (e.g., fiber, sugar, fat) and suitability for the patient's conditions, concern, and lab metrics. Exclude any foods listed as allergies from being considered healthy. Return a valid JSON object only, no extra text or code blocks, that can be parsed by json.loads, with:
+
+async def extract_entities_async(text: str, lab_reports: str, allergies: str) -> Dict:
+    response = await call_openrouter_api_async(*_entities_prompts(text, lab_reports, allergies), cache_ttl=LLM_CACHE_TTLS["entities"], expect_json=True)
+    return _parse_entities(response)
+
+
+DIET_ANALYSIS_PROMPT = """You are a medical AI assistant. Given the patient's current diet (list of foods), medical conditions, concern, lab metrics (if any), and allergies (if any), analyze each food to determine its healthiness based on its nutritional content (e.g., fiber, sugar, fat) and suitability for the patient's conditions, concern, and lab metrics. Exclude any foods listed as allergies from being considered healthy. Return a valid JSON object only, no extra text or code blocks, that can be parsed by json.loads, with:
 - 'healthy_foods': List of foods beneficial for the patient's health (e.g., ['steamed broccoli']). Consider high fiber, low sugar, low saturated fat, etc.
 - 'unhealthy_foods': List of foods that are not optimal or should be avoided, including allergens (e.g., ['gulab jamun']). Identify high sugar, high saturated fat, etc.
 - 'analysis': List of objects, one per food, with:
@@ -288,37 +530,78 @@ def analyze_current_diet(current_diet: str, conditions: List[str], concern: str,
   - 'healthy': Boolean indicating if the food is beneficial (true) or not (false).
   - 'reason': Brief explanation of why the food is healthy or unhealthy (e.g., 'High in sugar, may spike blood sugar').
 Ensure every food is analyzed, even if vague or a complex dish (e.g., 'paneer butter masala'). Treat dishes like 'gulab jamun' (high-sugar dessert) or 'samosa' (fried) as generally unhealthy unless specific conditions suggest otherwise. If no foods are healthy or all are allergens, healthy_foods can be empty. If no foods are unhealthy, unhealthy_foods can be empty. Return valid JSON only."""
-    prompt = f"Current diet: {', '.join(foods)}\nConditions: {', '.join(conditions) or 'None'}\nConcern: {concern or 'None'}\nLab metrics: {', '.join(lab_metrics) or 'None'}\nAllergies: {', '.join(allergies) or 'None'}"
+NO_FOODS_IDENTIFIED = "In your current diet, no specific foods were identified. Adopting healthier options can enhance your well-being."
+
+
+def _current_diet_foods(current_diet: str) -> List[str]:
+    # Clean parenthetical notes (e.g., "dessert (gulab jamun)" -> "gulab jamun")
+    current_diet = re.sub(r'\([^)]*\)', lambda m: m.group(0).strip('()'), current_diet)
+
+    # Parse foods, splitting on meal labels, conjunctions, commas, semicolons, periods
+    foods = [food.strip() for food in re.split(r'[,\s;]+and\s*|[,\s;]+|[:\n]+|with\s+|[.]', current_diet)
+             if food.strip() and not food.lower() in ['breakfast', 'lunch', 'dinner', 'snacks', 'evening', 'morning', 'dessert']]
+    return list(dict.fromkeys(foods))  # Remove duplicates
+
+
+def _diet_analysis_prompt(foods: List[str], conditions: List[str], concern: str, lab_metrics: List[str], allergies: List[str]) -> str:
+    return f"Current diet: {', '.join(foods)}\nConditions: {', '.join(conditions) or 'None'}\nConcern: {concern or 'None'}\nLab metrics: {', '.join(lab_metrics) or 'None'}\nAllergies: {', '.join(allergies) or 'None'}"
+
+
+def _format_diet_analysis(response: str, foods: List[str]) -> str:
+    result = json.loads(response)
+    healthy_foods = result.get('healthy_foods', [])
+    unhealthy_foods = result.get('unhealthy_foods', [])
+    analysis = result.get('analysis', [])
+
+    # Validate analysis covers all foods
+    analyzed_foods = {item['food'].lower() for item in analysis}
+    if not all(food.lower() in analyzed_foods for food in foods):
+        print(f"Warning: Not all foods analyzed. Foods: {foods}, Analyzed: {analyzed_foods}")
+        missing_foods = [food for food in foods if food.lower() not in analyzed_foods]
+        unhealthy_foods.extend(missing_foods)
+        analysis.extend([{'food': food, 'healthy': False, 'reason': 'Not analyzed, assumed suboptimal'} for food in missing_foods])
+
+    # Format output
+    if healthy_foods:
+        return f"In your current diet, the following foods are healthy and beneficial: {', '.join(healthy_foods)}. These choices support your health goals. The remaining foods are not optimal; consider replacing them with healthier options to enhance your well-being."
+    else:
+        return f"In your current diet, no foods were identified as healthy and beneficial. The listed foods are not optimal; consider replacing them with healthier options to enhance your well-being."
+
+
+def _diet_analysis_fallback(foods: List[str]) -> str:
+    return f"In your current diet, no foods were identified as healthy and beneficial. The listed foods ({', '.join(foods)}) are not optimal; consider replacing them with healthier options to enhance your well-being."
+
+
+async def analyze_current_diet_async(current_diet: str, conditions: List[str], concern: str, lab_metrics: List[str], allergies: List[str]) -> str:
+    if not current_diet.strip():
+        return ""
+    foods = _current_diet_foods(current_diet)
+    if not foods:
+        return NO_FOODS_IDENTIFIED
     try:
-        response = call_openrouter_api(prompt, system_prompt)
-        result = json.loads(response)
-        healthy_foods = result.get('healthy_foods', [])
-        unhealthy_foods = result.get('unhealthy_foods', [])
-        analysis = result.get('analysis', [])
-        
-        # Validate analysis covers all foods
-        analyzed_foods = {item['food'].lower() for item in analysis}
-        if not all(food.lower() in analyzed_foods for food in foods):
-            print(f"Warning: Not all foods analyzed. Foods: {foods}, Analyzed: {analyzed_foods}")
-            missing_foods = [food for food in foods if food.lower() not in analyzed_foods]
-            unhealthy_foods.extend(missing_foods)
-            analysis.extend([{'food': food, 'healthy': False, 'reason': 'Not analyzed, assumed suboptimal'} for food in missing_foods])
-        
-        # Format output
-        if healthy_foods:
-            return f"In your current diet, the following foods are healthy and beneficial: {', '.join(healthy_foods)}. These choices support your health goals. The remaining foods are not optimal; consider replacing them with healthier options to enhance your well-being."
-        else:
-            return f"In your current diet, no foods were identified as healthy and beneficial. The listed foods are not optimal; consider replacing them with healthier options to enhance your well-being."
+        response = await call_openrouter_api_async(_diet_analysis_prompt(foods, conditions, concern, lab_metrics, allergies), DIET_ANALYSIS_PROMPT, expect_json=True)
+        return _format_diet_analysis(response, foods)
     except (json.JSONDecodeError, Exception) as e:
         print(f"Current diet analysis error: {e} - Response: {response if 'response' in locals() else 'No response'}")
-        return f"In your current diet, no foods were identified as healthy and beneficial. The listed foods ({', '.join(foods)}) are not optimal; consider replacing them with healthier options to enhance your well-being."
+        return _diet_analysis_fallback(foods)
+
+
+DEFAULT_DIET_INTRO = "To support your recovery and improve your health, include these nutrient-rich foods tailored to your needs."
+SUGGESTIONS_FALLBACK = {
+    'diet_plan': [DEFAULT_DIET_INTRO, "Try to include the following foods to improve your diet"],
+    'exercise_plan': []
+}
 
-def generate_suggestions(conditions: List[str], concern: str, current_diet: str, lab_metrics: List[str], allergies: List[str]) -> Dict:
+# Max diet/exercise items enriched (image/video lookups) at the same time
+ENRICH_CONCURRENCY = int(os.getenv("ENRICH_CONCURRENCY", "8"))
+
+
+def _suggestions_prompt(conditions: List[str], concern: str, lab_metrics: List[str], allergies: List[str]) -> str:
     conditions_str = ', '.join(conditions) or 'None'
     concern_str = concern or 'None'
     lab_metrics_str = ', '.join(lab_metrics) or 'None'
     allergies_str = ', '.join(allergies) or 'None'
-    prompt = f"""Patient conditions: {conditions_str}. Concern: {concern_str}. Lab metrics: {lab_metrics_str}. Allergies: {allergies_str}.
+    return f"""Patient conditions: {conditions_str}. Concern: {concern_str}. Lab metrics: {lab_metrics_str}. Allergies: {allergies_str}.
 Provide valid JSON object only, no extra text or code blocks, that can be parsed by json.loads, with:
     - 'diet_plan': List of exactly 5-7 objects, each with:
         - 'nutrient': A specific nutrient needed based on the patient's conditions, concern, and lab metrics (e.g., 'Fiber', 'Iron').
@@ -330,122 +613,235 @@ Provide valid JSON object only, no extra text or code blocks, that can be parsed
         - 'description': A short description of the exercise tailored to the patient's conditions, concern, and lab metrics (e.g., 'Gentle stretching exercises focusing on the legs and knees').
         Exercises must be personalized to help the patient recover and improve health (e.g., gentle exercises for low hemoglobin, cardio for high cholesterol).
     All suggestions must be personalized, not generic, and diet suggestions must exclude allergens. Return valid JSON only."""
+
+
+def _is_allergen(food: str, allergies: List[str]) -> bool:
+    return any(allergen.lower() in food.lower() for allergen in allergies)
+
+
+def suggested_diet_items(suggestions: Dict, allergies: List[str]) -> List[Dict[str, str]]:
+    """Complete, allergen-free diet suggestions, in model order."""
+    items = []
+    for sugg in suggestions.get('diet_plan', []):
+        nutrient = sugg.get('nutrient', '')
+        food = sugg.get('food', '')
+        reason = sugg.get('reason', '')
+        if not nutrient or not food or not reason:
+            continue
+        if _is_allergen(food, allergies):
+            continue
+        items.append({"nutrient": nutrient, "food": food, "reason": reason})
+    return items
+
+
+def suggested_exercise_items(suggestions: Dict) -> List[Dict[str, str]]:
+    items = []
+    for ex in suggestions.get('exercise_plan', []):
+        name = ex.get('name', '')
+        description = ex.get('description', '')
+        if name and description:
+            items.append({"name": name, "description": description})
+    return items
+
+
+def _alt_foods_prompt(nutrient: str, food: str) -> str:
+    return f"List 3 simple, common, cooked or ready-to-eat foods (not raw ingredients) rich in {nutrient}, excluding {food}. Only list the food names, comma separated."
+
+
+async def _bounded_gather(coros: List, limit: int) -> List:
+    """gather() with at most `limit` coroutines running; results keep input order."""
+    sem = asyncio.Semaphore(max(1, limit))
+
+    async def run(coro):
+        async with sem:
+            return await coro
+
+    return await asyncio.gather(*(run(c) for c in coros))
+
+
+async def enrich_diet_item_async(item: Dict[str, str], allergies: List[str]) -> Optional[Dict[str, str]]:
+    """Attach an image to a diet suggestion. If only the placeholder is
+    found, ask for alternative foods rich in the same nutrient and use the
+    first (in the model's order) that has an image. None drops the item."""
+    image_url = await fetch_food_image_async(item["food"])
+    if image_url != PLACEHOLDER_IMAGE:
+        return {**item, "image_url": image_url}
     try:
-        response = call_openrouter_api(prompt)
-        suggestions = json.loads(response)
-        # Add diet analysis and image URLs to diet_plan
-        diet_with_images = []
-        if current_diet:
-            diet_analysis = analyze_current_diet(current_diet, conditions, concern, lab_metrics, allergies)
-            if diet_analysis:
-                diet_with_images.append({"analysis": diet_analysis})
-        else:
-            diet_with_images.append({"analysis": "To support your recovery and improve your health, include these nutrient-rich foods tailored to your needs."})
-        # For each suggested food, pair with its image and nutrition
-        for sugg in suggestions.get('diet_plan', []):
-            nutrient = sugg.get('nutrient', '')
-            food = sugg.get('food', '')
-            reason = sugg.get('reason', '')
-            if not nutrient or not food or not reason:
-                continue
-            if any(allergen.lower() in food.lower() for allergen in allergies):
-                continue
-            image_url = fetch_food_image(food)
-            # If no image found (placeholder), try alternative foods for the same nutrient
-            if image_url == PLACEHOLDER_IMAGE:
-                alt_prompt = f"List 3 simple, common, cooked or ready-to-eat foods (not raw ingredients) rich in {nutrient}, excluding {food}. Only list the food names, comma separated."
-                try:
-                    alt_foods_str = call_openrouter_api(alt_prompt)
-                    alt_foods = [f.strip() for f in alt_foods_str.split(',') if f.strip()]
-                    found = False
-                    for alt_food in alt_foods:
-                        if any(allergen.lower() in alt_food.lower() for allergen in allergies):
-                            continue
-                        alt_image_url = fetch_food_image(alt_food)
-                        if alt_image_url != PLACEHOLDER_IMAGE:
-                            diet_with_images.append({
-                                "nutrient": nutrient,
-                                "food": alt_food,
-                                "reason": reason,
-                                "image_url": alt_image_url
-                            })
-                            found = True
-                            break
-                    if not found:
-                        continue  # Skip if no image found for any alternative
-                except Exception as e:
-                    print(f"Error finding alternative food for {nutrient}: {e}")
-                    continue
-            else:
-                diet_with_images.append({
-                    "nutrient": nutrient,
-                    "food": food,
-                    "reason": reason,
-                    "image_url": image_url
-                })
-        suggestions['diet_plan'] = diet_with_images
-        
-        # Add video URLs to exercise_plan in structured format
-        exercise_with_videos = []
-        for ex in suggestions.get('exercise_plan', []):
-            name = ex.get('name', '')
-            description = ex.get('description', '')
-            if not name or not description:
-                continue
-            video_url = fetch_exercise_video(name, description)
-            if video_url:  # Only include exercises with relevant videos
-                exercise_with_videos.append({
-                    "name": name,
-                    "reason": description,
-                    "video_url": video_url
-                })
-        suggestions['exercise_plan'] = exercise_with_videos
-        
-        return suggestions
+        alt_foods_str = await call_openrouter_api_async(_alt_foods_prompt(item["nutrient"], item["food"]), cache_ttl=LLM_CACHE_TTLS["alt_foods"])
+        alt_foods = [f.strip() for f in alt_foods_str.split(',') if f.strip()]
+        alt_foods = [f for f in alt_foods if not _is_allergen(f, allergies)]
+        alt_images = await asyncio.gather(*(fetch_food_image_async(f) for f in alt_foods))
+        for alt_food, alt_image_url in zip(alt_foods, alt_images):
+            if alt_image_url != PLACEHOLDER_IMAGE:
+                return {**item, "food": alt_food, "image_url": alt_image_url}
+    except Exception as e:
+        print(f"Error finding alternative food for {item['nutrient']}: {e}")
+    return None  # Skip if no image found for any alternative
+
+
+async def enrich_exercise_item_async(item: Dict[str, str]) -> Optional[Dict[str, str]]:
+    video_url = await fetch_exercise_video_async(item["name"], item["description"])
+    if not video_url:  # Only include exercises with relevant videos
+        return None
+    return {"name": item["name"], "reason": item["description"], "video_url": video_url}
+
+
+async def enrich_diet_items_async(items: List[Dict[str, str]], allergies: List[str]) -> List[Dict[str, str]]:
+    results = await _bounded_gather([enrich_diet_item_async(i, allergies) for i in items], ENRICH_CONCURRENCY)
+    return [r for r in results if r]
+
+
+async def enrich_exercise_items_async(items: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    results = await _bounded_gather([enrich_exercise_item_async(i) for i in items], ENRICH_CONCURRENCY)
+    return [r for r in results if r]
+
+
+async def suggest_async(conditions: List[str], concern: str, lab_metrics: List[str], allergies: List[str]) -> Optional[Dict]:
+    """Raw diet/exercise suggestions from the LLM (one call for both), or
+    None if the call or its JSON failed."""
+    prompt = _suggestions_prompt(conditions, concern, lab_metrics, allergies)
+    try:
+        response = await call_openrouter_api_async(prompt, expect_json=True)
+        return json.loads(response)
     except (json.JSONDecodeError, Exception) as e:
         print(f"Suggestions error: {e} - Response: {response if 'response' in locals() else 'No response'}")
-        return {
-            'diet_plan': ["To support your recovery and improve your health, include these nutrient-rich foods tailored to your needs.", "Try to include the following foods to improve your diet"],
-            'exercise_plan': []
-        }
-
-def get_medicine_reason(medicine_name: str) -> str:
-    """
-    Calls OpenRouter API to fetch ONLY the reason for prescription in JSON format.
-    """
-    url = "https://openrouter.ai/api/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": "gpt-4o-mini",
-        "messages": [
-            {
-                "role": "system",
-                "content": (
-                    "You are a medical assistant. "
-                    "Return ONLY valid JSON in the form {\"reason\": \"...\"}. "
-                    "The reason should be 1–2 sentences explaining why the medicine is prescribed. "
-                    "Do NOT include dosage, side effects, or instructions. JSON only, no extra text."
-                )
-            },
-            {
-                "role": "user",
-                "content": f"Explain why {medicine_name} is prescribed."
-            }
-        ]
-    }
+        return None
+
+
+async def diet_intro_async(current_diet: str, conditions: List[str], concern: str, lab_metrics: List[str], allergies: List[str]) -> List[Dict[str, str]]:
+    """Leading {"analysis": ...} entry of a diet plan."""
+    if not current_diet:
+        return [{"analysis": DEFAULT_DIET_INTRO}]
+    diet_analysis = await analyze_current_diet_async(current_diet, conditions, concern, lab_metrics, allergies)
+    return [{"analysis": diet_analysis}] if diet_analysis else []
 
-    response = requests.post(url, headers=headers, json=data)
-    if response.status_code != 200:
-        raise HTTPException(status_code=500, detail="❌ Error fetching medicine info.")
 
-    result = response.json()
-    raw_output = result["choices"][0]["message"]["content"].strip()
+async def generate_suggestions_async(conditions: List[str], concern: str, current_diet: str, lab_metrics: List[str], allergies: List[str]) -> Dict:
+    """Diet/exercise suggestions with the diet analysis, every food image and
+    every exercise video resolved concurrently (at most ENRICH_CONCURRENCY items at
+    a time). Output order matches the model's suggestion order."""
+    suggestions = await suggest_async(conditions, concern, lab_metrics, allergies)
+    if suggestions is None:
+        return dict(SUGGESTIONS_FALLBACK)
+    try:
+        intro, diet, exercise = await asyncio.gather(
+            diet_intro_async(current_diet, conditions, concern, lab_metrics, allergies),
+            enrich_diet_items_async(suggested_diet_items(suggestions, allergies), allergies),
+            enrich_exercise_items_async(suggested_exercise_items(suggestions)),
+        )
+    except Exception as e:
+        print(f"Suggestions error: {e}")
+        return dict(SUGGESTIONS_FALLBACK)
+    suggestions['diet_plan'] = intro + diet
+    suggestions['exercise_plan'] = exercise
+    return suggestions
+
+
+MEDICINE_REASON_PROMPT = (
+    "You are a medical assistant. "
+    "Return ONLY valid JSON in the form {\"reason\": \"...\"}. "
+    "The reason should be 1–2 sentences explaining why the medicine is prescribed. "
+    "Do NOT include dosage, side effects, or instructions. JSON only, no extra text."
+)
+
+
+def _medicine_reason_prompt(medicine_name: str) -> str:
+    return f"Explain why {medicine_name} is prescribed."
+
+
+def _parse_medicine_reason(content: str) -> str:
+    raw_output = content.strip()
 
     try:
         parsed = json.loads(raw_output)
         return parsed.get("reason", "No reason found")
     except Exception:
         return raw_output  # fallback if parsing fails
+
+
+async def get_medicine_reason_async(medicine_name: str) -> str:
+    """Prescription reason for one medicine (JSON {"reason": ...} from the LLM)."""
+    try:
+        content = await call_openrouter_api_async(_medicine_reason_prompt(medicine_name), MEDICINE_REASON_PROMPT, model="gpt-4o-mini",
+                                                  cache_ttl=LLM_CACHE_TTLS["medicine_reason"], expect_json=True)
+    except ValueError:
+        raise HTTPException(status_code=500, detail="❌ Error fetching medicine info.")
+    return _parse_medicine_reason(content)
+
+
+MEDICINE_REASONS_PROMPT = (
+    "You are a medical assistant. "
+    "You are given a JSON array of medicine names. "
+    "Return ONLY valid JSON in the form {\"reasons\": {\"<medicine name>\": \"...\"}} with one entry per given name, "
+    "using each name exactly as given. "
+    "Each reason should be 1–2 sentences explaining why the medicine is prescribed. "
+    "Do NOT include dosage, side effects, or instructions. JSON only, no extra text."
+)
+
+
+def _parse_medicine_reasons(content: str, names: List[str]) -> Dict[str, str]:
+    """Map each requested name to its reason; names missing from the answer
+    are left out."""
+    try:
+        reasons = json.loads(content).get("reasons", {})
+    except (json.JSONDecodeError, AttributeError):
+        return {}
+    if not isinstance(reasons, dict):
+        return {}
+    by_lower = {str(k).strip().lower(): v for k, v in reasons.items() if isinstance(v, str) and v.strip()}
+    return {name: by_lower[name.lower()] for name in names if name.lower() in by_lower}
+
+
+async def _medicine_reasons_batch(names: List[str]) -> Dict[str, str]:
+    content = await call_openrouter_api_async(json.dumps(names), MEDICINE_REASONS_PROMPT, model="gpt-4o-mini", fresh=True)
+    return _parse_medicine_reasons(content, names)
+
+
+async def get_medicine_reasons_async(medicine_names: List[str]) -> Dict[str, str]:
+    """Prescription reasons for many medicines, keyed by the given names.
+    Cached names are answered from MEDICINE_REASON_CACHE in one query; the
+    rest go to the LLM in batches of MEDICINE_REASON_BATCH_SIZE (one request each, all
+    batches concurrently). Names a batch answer leaves out fall back to
+    get_medicine_reason_async. A failed lookup, or one that comes back with
+    an empty reason, maps the name to an "Error getting information" message
+    and is not cached."""
+    names = list(dict.fromkeys(n for n in medicine_names if n and n.strip()))
+    # lowercased name -> reason, one cache query for all names
+    cached = await MEDICINE_REASON_CACHE.get_many(n.strip().lower() for n in names)
+    reasons: Dict[str, str] = {k: v for k, v in cached.items() if isinstance(v, str) and v.strip()}
+
+    # One lookup per distinct uncached name
+    pending_by_key: Dict[str, str] = {}
+    for name in names:
+        if name.strip().lower() not in reasons:
+            pending_by_key.setdefault(name.strip().lower(), name.strip())
+    pending = list(pending_by_key.values())
+    batches = [pending[i:i + MEDICINE_REASON_BATCH_SIZE] for i in range(0, len(pending), MEDICINE_REASON_BATCH_SIZE)]
+    answers = await asyncio.gather(*(_medicine_reasons_batch(b) for b in batches), return_exceptions=True)
+    found: Dict[str, str] = {}
+    for batch, answer in zip(batches, answers):
+        if isinstance(answer, Exception):
+            print(f"[medicine_reason] batch of {len(batch)} failed: {answer}")
+            continue
+        found.update(answer)
+
+    missing = [n for n in pending if n not in found]
+    singles = await asyncio.gather(*(get_medicine_reason_async(n) for n in missing), return_exceptions=True)
+    errors: Dict[str, str] = {}
+    for name, reason in zip(missing, singles):
+        if isinstance(reason, Exception):
+            detail = reason.detail if isinstance(reason, HTTPException) else str(reason)
+            errors[name.lower()] = f"Error getting information: {detail}"
+        elif not isinstance(reason, str) or not reason.strip():
+            errors[name.lower()] = "Error getting information: empty reason"
+        else:
+            found[name] = reason
+
+    fresh = {name.lower(): reason for name, reason in found.items()}
+    reasons.update(fresh)
+    await MEDICINE_REASON_CACHE.set_many(fresh, LLM_CACHE_TTLS["medicine_reason"])
+    result: Dict[str, str] = {}
+    for name in names:
+        key = name.strip().lower()
+        result[name] = reasons[key] if key in reasons else errors.get(key, "Error getting information")
+    return result
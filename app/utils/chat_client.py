@@ -0,0 +1,60 @@
+# app/utils/chat_client.py
+import asyncio
+import os
+from typing import Dict, List, Optional
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+# Shared async OpenRouter client for the chat flow (chatbot answers and
+# intent parsing), opened/closed by the app lifespan.
+CHAT_API_BASE = "https://openrouter.ai/api/v1"
+CHAT_API_KEY = os.getenv("OPENAI_API_KEY_CHATBOT")
+CHAT_MODEL = "openai/gpt-4o-mini"
+CHAT_TIMEOUT = float(os.getenv("CHAT_LLM_TIMEOUT", "20"))
+CHAT_MAX_RETRIES = int(os.getenv("CHAT_LLM_MAX_RETRIES", "2"))
+# Max chat completions in flight per worker; further calls wait for a slot
+CHAT_CONCURRENCY = int(os.getenv("CHAT_LLM_CONCURRENCY", "16"))
+CHAT_MAX_CONNECTIONS = int(os.getenv("CHAT_LLM_MAX_CONNECTIONS", "32"))
+
+_client: Optional[AsyncOpenAI] = None
+_limit: Optional[asyncio.Semaphore] = None
+
+
+async def start_chat_client() -> AsyncOpenAI:
+    global _client, _limit
+    if _client is None:
+        _client = AsyncOpenAI(
+            base_url=CHAT_API_BASE,
+            api_key=CHAT_API_KEY,
+            timeout=CHAT_TIMEOUT,
+            max_retries=CHAT_MAX_RETRIES,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=CHAT_MAX_CONNECTIONS, max_keepalive_connections=CHAT_MAX_CONNECTIONS),
+            ),
+        )
+        _limit = asyncio.Semaphore(CHAT_CONCURRENCY)
+    return _client
+
+
+async def close_chat_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+async def chat_completion(messages: List[Dict[str, str]], max_tokens: int, temperature: Optional[float] = None,
+                          timeout: float = CHAT_TIMEOUT, model: str = CHAT_MODEL) -> str:
+    """Content of one chat completion, holding a CHAT_CONCURRENCY slot."""
+    client = await start_chat_client()
+    kwargs = {"temperature": temperature} if temperature is not None else {}
+    async with _limit:
+        response = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            timeout=timeout,
+            **kwargs
+        )
+    return response.choices[0].message.content
@@ -0,0 +1,60 @@
+# app/utils/curate_media_catalog.py
+"""Fill in the curated media catalog seed (app/data/media_catalog.json).
+
+Names listed in the seed without a URL are resolved once through the
+regular Unsplash/YouTube lookups and written back into the file, to be
+reviewed and committed; from then on those items are served from the
+catalog and never reach the APIs. Needs UNSPLASH_API_KEY, YOUTUBE_API_KEY
+and OPENROUTER_API_KEY (video search terms).
+
+    python -m app.utils.curate_media_catalog [--refresh]
+"""
+import argparse
+import asyncio
+import json
+
+from ..service import crud_media_catalog as media_catalog
+from .ai_agent import PLACEHOLDER_IMAGE, close_http_client, fetch_exercise_video_async, fetch_food_image_async
+
+
+async def curate(path: str, refresh: bool = False) -> dict:
+    """Resolve the seed's missing URLs (every URL with `refresh`) and write
+    the file back. Returns {"resolved": n, "unresolved": [names]}."""
+    with open(path, encoding="utf-8") as f:
+        seed = json.load(f)
+    # raw API results only: nothing from the catalog, nothing promoted
+    media_catalog.MEDIA_CATALOG_PROMOTE = False
+    resolved, unresolved = 0, []
+    try:
+        for name, url in seed.get("food", {}).items():
+            if url and not refresh:
+                continue
+            image = await fetch_food_image_async(name)
+            if image and image != PLACEHOLDER_IMAGE:
+                seed["food"][name] = image
+                resolved += 1
+            else:
+                unresolved.append(f"food:{name}")
+        for name, url in seed.get("exercise", {}).items():
+            if url and not refresh:
+                continue
+            video = await fetch_exercise_video_async(name, name)
+            if video:
+                seed["exercise"][name] = video
+                resolved += 1
+            else:
+                unresolved.append(f"exercise:{name}")
+    finally:
+        await close_http_client()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(seed, f, indent=2)
+        f.write("\n")
+    return {"resolved": resolved, "unresolved": unresolved}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resolve URLs for the curated media catalog seed")
+    parser.add_argument("--path", default=media_catalog.MEDIA_CATALOG_SEED)
+    parser.add_argument("--refresh", action="store_true", help="re-resolve entries that already have a URL")
+    args = parser.parse_args()
+    print(f"[curate_media_catalog] {asyncio.run(curate(args.path, args.refresh))}")
@@ -0,0 +1,121 @@
+# app/utils/section_index.py
+import re
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_DEFAULT_FLAGS = re.IGNORECASE | re.MULTILINE
+
+
+class SectionIndex:
+    """Heading/boundary offsets of one document, found in a single scan.
+    Sections are returned as slices of the original text.
+    """
+
+    def __init__(self, text: str, headings: List[Tuple[str, int, int]], boundaries: List[int],
+                 indexer: Optional["SectionIndexer"] = None):
+        self.text = text
+        self.indexer = indexer
+        self.headings = headings          # (key, start, end) in document order
+        self.boundaries = boundaries      # sorted offsets that end any section
+        self._first: Dict[str, int] = {}
+        for pos, (key, _, _) in enumerate(headings):
+            self._first.setdefault(key, pos)
+
+    def has(self, key: str) -> bool:
+        return key in self._first
+
+    def feed(self, chunk: str, sep: str = "\n") -> None:
+        """Append `chunk` (e.g. one more page) and index only the new text.
+        Headings must not straddle chunks, which holds for line headings when
+        chunks are whole pages.
+        """
+        if not chunk:
+            return
+        base = len(self.text) + len(sep) if self.text else 0
+        self.text = self.text + sep + chunk if self.text else chunk
+        more = self.indexer.index(chunk)
+        for key, h_start, h_end in more.headings:
+            self._first.setdefault(key, len(self.headings))
+            self.headings.append((key, h_start + base, h_end + base))
+        self.boundaries.extend(b + base for b in more.boundaries)
+
+    def is_closed(self, key: str, until: Optional[Iterable[str]] = None) -> bool:
+        """True once the `key` heading and something ending its section have
+        been seen, i.e. more text can no longer change `section(key)`."""
+        pos = self._first.get(key)
+        if pos is None:
+            return False
+        stops = None if until is None else set(until)
+        for other, _, _ in self.headings[pos + 1:]:
+            if other != key and (stops is None or other in stops):
+                return True
+        text = self.text
+        body = self.headings[pos][2]
+        while body < len(text) and text[body].isspace():
+            body += 1
+        return bisect_left(self.boundaries, body) < len(self.boundaries)
+
+    def section(self, key: str, until: Optional[Iterable[str]] = None) -> str:
+        """Text after the first `key` heading up to the next terminating heading.
+        `until` lists heading keys that end the section (default: every other
+        known heading); pass () to stop only at boundaries / end of text.
+        """
+        pos = self._first.get(key)
+        if pos is None:
+            return ""
+        text = self.text
+        start = self.headings[pos][2]
+        end = len(text)
+        stops = None if until is None else set(until)
+        for other, h_start, _ in self.headings[pos + 1:]:
+            if other != key and (stops is None or other in stops):
+                end = h_start
+                break
+        # boundaries only count past the whitespace that follows the heading
+        # (mirrors a greedy `\s*` after it)
+        body = start
+        while body < end and text[body].isspace():
+            body += 1
+        b = bisect_left(self.boundaries, body)
+        if b < len(self.boundaries) and self.boundaries[b] < end:
+            end = self.boundaries[b]
+        return text[start:end].strip()
+
+    def sections(self, until: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        return {key: self.section(key, until) for key in self._first}
+
+
+class SectionIndexer:
+    """Precompiles a set of headings into one alternation so that a document
+    is scanned once regardless of how many sections are pulled from it.
+
+    `headings` maps a section key to a regex fragment for its heading.
+    `boundary` is an optional regex marking generic section ends
+    (e.g. any "Label:" line); only its start offset is recorded.
+    """
+
+    def __init__(self, headings: Dict[str, str], boundary: Optional[str] = None,
+                 flags: int = _DEFAULT_FLAGS):
+        self.keys: List[str] = list(headings)
+        parts = [f"(?P<h{i}>{frag})" for i, frag in enumerate(headings.values())]
+        if boundary:
+            parts.append(f"(?P<b>{boundary})")
+        self.pattern = re.compile("|".join(parts), flags)
+
+    def index(self, text: str) -> SectionIndex:
+        headings: List[Tuple[str, int, int]] = []
+        boundaries: List[int] = []
+        if text:
+            keys = self.keys
+            for m in self.pattern.finditer(text):
+                group = m.lastgroup
+                if group == "b":
+                    boundaries.append(m.start())
+                else:
+                    headings.append((keys[int(group[1:])], m.start(), m.end()))
+        return SectionIndex(text or "", headings, boundaries, self)
+
+
+def line_heading(title: str) -> str:
+    """Fragment matching `title` alone on its own line, with an optional colon."""
+    return rf"^[^\S\n]*{re.escape(title)}\s*:?[^\S\n]*$"
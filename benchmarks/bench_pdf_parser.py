@@ -0,0 +1,149 @@
+# benchmarks/bench_pdf_parser.py
+"""Throughput benchmarks for app/pdf_parser.py.
+
+    python -m benchmarks.bench_pdf_parser                     # run and print
+    python -m benchmarks.bench_pdf_parser --save-baseline     # write benchmarks/baseline.json
+    python -m benchmarks.bench_pdf_parser --compare           # fail on regressions vs baseline
+
+Each scenario generates a synthetic care plan PDF (see corpus.py) and times
+parse_pdf, _find_section, _split_to_blocks and parse_medications_section
+separately. Timings are the best of --repeat runs.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from app import pdf_parser
+from benchmarks.corpus import careplan_lines, write_pdf
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+SCENARIOS: List[dict] = [
+    {"name": "small", "pages": 2, "medications": 8, "appointments": 3, "quirks": False},
+    {"name": "typical", "pages": 8, "medications": 20, "appointments": 5, "quirks": True},
+    {"name": "long_appendix", "pages": 40, "medications": 15, "appointments": 4, "appendix_lines": 200, "quirks": True},
+    {"name": "med_reconciliation", "pages": 12, "medications": 150, "appointments": 6, "quirks": True},
+]
+QUICK = {"small", "typical"}
+
+NEXT_HEADINGS = ["Appointments", "Notes", "Care Plan", "Medical History"]
+
+
+def _best(fn: Callable[[], object], repeat: int, inner: int = 1) -> float:
+    """Best per-call wall time in seconds over `repeat` rounds of `inner` calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for _ in range(inner):
+            fn()
+        best = min(best, (time.perf_counter() - t) / inner)
+    return best
+
+
+def run_scenario(sc: dict, workdir: str, repeat: int, mode: str) -> Dict[str, float]:
+    lines = careplan_lines(
+        medications=sc["medications"],
+        appointments=sc["appointments"],
+        appendix_lines=sc.get("appendix_lines", 0),
+        quirks=sc.get("quirks", True),
+    )
+    path = os.path.join(workdir, f"{sc['name']}.pdf")
+    pages = write_pdf(path, lines, pages=sc["pages"])
+
+    full_text = "\n".join(t for t in pdf_parser.extract_pages_text(path) if t)
+    meds_text = pdf_parser._find_section(full_text, "Medications", NEXT_HEADINGS)
+    meds = len(pdf_parser.parse_medications_section(meds_text))
+
+    parse_s = _best(lambda: pdf_parser.parse_pdf_with_stats(path, "bench", mode), repeat)
+    find_s = _best(lambda: pdf_parser._find_section(full_text, "Medications", NEXT_HEADINGS), repeat, inner=200)
+    split_s = _best(lambda: pdf_parser._split_to_blocks(meds_text), repeat, inner=200)
+    meds_s = _best(lambda: pdf_parser.parse_medications_section(meds_text), repeat, inner=20)
+
+    return {
+        "pages": pages,
+        "medications": meds,
+        "parse_pdf_s": parse_s,
+        "find_section_s": find_s,
+        "split_to_blocks_s": split_s,
+        "parse_medications_s": meds_s,
+        "pages_per_s": pages / parse_s,
+        "medications_per_s": meds / meds_s if meds else 0.0,
+    }
+
+
+TIMED = ["parse_pdf_s", "find_section_s", "split_to_blocks_s", "parse_medications_s"]
+
+
+def print_report(results: Dict[str, Dict[str, float]]) -> None:
+    header = f"{'scenario':<20}{'pages':>6}{'meds':>6}{'parse_pdf':>12}{'find_sect':>12}{'split':>12}{'meds_parse':>12}{'pages/s':>10}{'meds/s':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(f"{name:<20}{r['pages']:>6}{r['medications']:>6}"
+              f"{r['parse_pdf_s'] * 1e3:>10.2f}ms{r['find_section_s'] * 1e6:>10.1f}us"
+              f"{r['split_to_blocks_s'] * 1e6:>10.1f}us{r['parse_medications_s'] * 1e3:>10.2f}ms"
+              f"{r['pages_per_s']:>10.1f}{r['medications_per_s']:>10.0f}")
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    """Return one message per timed metric that is slower than the baseline
+    by more than `tolerance` (0.2 = 20%)."""
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric in TIMED:
+            if metric not in base:
+                continue
+            ratio = r[metric] / base[metric] if base[metric] else 1.0
+            flag = "REGRESSION" if ratio > 1 + tolerance else ""
+            print(f"{name:<20}{metric:<22}{base[metric] * 1e3:>10.3f}ms -> {r[metric] * 1e3:>10.3f}ms  {ratio:>6.2f}x {flag}")
+            if flag:
+                regressions.append(f"{name}.{metric} {ratio:.2f}x slower")
+    return regressions
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--quick", action="store_true", help="only the small scenarios")
+    ap.add_argument("--mode", default="parallel", help="parse_pdf extraction mode (parallel | lazy)")
+    ap.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, metavar="PATH")
+    ap.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, metavar="PATH")
+    ap.add_argument("--tolerance", type=float, default=0.2)
+    args = ap.parse_args(argv)
+
+    scenarios = [sc for sc in SCENARIOS if not args.quick or sc["name"] in QUICK]
+    results: Dict[str, Dict[str, float]] = {}
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for sc in scenarios:
+                results[sc["name"]] = run_scenario(sc, workdir, args.repeat, args.mode)
+    finally:
+        pdf_parser.shutdown_pdf_pool()
+
+    print_report(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nbaseline written to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\n" + "\n".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# benchmarks/corpus.py
+"""Synthetic care plan PDFs for the parser benchmarks.
+
+PDFs are written directly (Helvetica text, one content stream per page), so
+generating a corpus needs nothing beyond the standard library.
+"""
+import random
+from typing import List, Optional
+
+LINES_PER_PAGE = 50
+
+DRUGS = ["Metformin", "Lisinopril", "Atorvastatin", "Amlodipine", "Omeprazole", "Levothyroxine",
+         "Aspirin", "Metoprolol", "Losartan", "Gabapentin", "Furosemide", "Warfarin"]
+TIMES = ["morning", "afternoon", "evening", "night"]
+SPECIALTIES = ["Cardiology", "Endocrinology", "Nephrology", "Ophthalmology", "Physiotherapy", "Dietitian"]
+FILLER = ("Patient education material follows. Keep this document for your records and bring it "
+          "to every visit. Contact the clinic if symptoms worsen.")
+
+
+def _heading(title: str, quirks: bool, rnd: random.Random) -> str:
+    if not quirks:
+        return title
+    return rnd.choice([title, title.upper(), title.lower(), title + ":", " " + title.upper() + " :"])
+
+
+def _bullet(i: int, quirks: bool, rnd: random.Random) -> str:
+    if not quirks:
+        return "- "
+    return rnd.choice(["- ", "• ", "* ", f"{i + 1}. "])
+
+
+def careplan_lines(medications: int = 10, appointments: int = 4, history_lines: int = 6,
+                   appendix_lines: int = 0, quirks: bool = True, seed: int = 0) -> List[str]:
+    """Text lines of one synthetic care plan, in document order."""
+    rnd = random.Random(seed)
+    lines = ["Discharge Care Plan", ""]
+
+    lines.append(_heading("Medical History", quirks, rnd))
+    for i in range(history_lines):
+        lines.append(f"History note {i + 1}: type 2 diabetes, hypertension, follow-up required.")
+    lines.append("")
+
+    lines.append(_heading("Medications", quirks, rnd))
+    for i in range(medications):
+        drug = f"{rnd.choice(DRUGS)}-{i}"
+        slots = ", ".join(rnd.sample(TIMES, rnd.randint(1, 3)))
+        if quirks and i % 3 == 1:
+            # single-line layout
+            lines.append(f"{_bullet(i, quirks, rnd)}{drug} Dose: {rnd.choice([5, 10, 20, 500])}mg")
+        else:
+            lines.append(f"{_bullet(i, quirks, rnd)}Name: {drug}")
+            lines.append(f"Dose: {rnd.choice([5, 10, 20, 500])}mg")
+        lines.append(f"Time: {slots}")
+        lines.append(f"Duration: {rnd.randint(5, 90)} days")
+        if quirks and i % 4 == 3:
+            lines.append("")
+    lines.append("")
+
+    lines.append(_heading("Appointments", quirks, rnd))
+    for i in range(appointments):
+        lines.append(f"{_bullet(i, quirks, rnd)}{rnd.choice(SPECIALTIES)} follow-up visit {i + 1}")
+    lines.append("")
+
+    lines.append(_heading("Notes", quirks, rnd))
+    for i in range(appendix_lines):
+        lines.append(f"Appendix {i + 1}. {FILLER}"[:110])
+    return lines
+
+
+def _pdf_string(text: str) -> bytes:
+    raw = text.encode("cp1252", errors="replace")
+    return b"(" + raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def write_pdf(path: str, lines: List[str], pages: Optional[int] = None) -> int:
+    """Write `lines` to a PDF at `path`, LINES_PER_PAGE per page. With `pages`
+    set, the document is padded with filler pages up to that count.
+    Returns the number of pages written."""
+    chunks = [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)] or [[]]
+    while pages and len(chunks) < pages:
+        chunks.append([f"{FILLER[:90]} ({len(chunks) + 1}.{j})" for j in range(LINES_PER_PAGE)])
+
+    objects: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # page tree, filled in below
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    kids = []
+    for chunk in chunks:
+        ops = [b"BT /F1 10 Tf 14 TL 50 780 Td"]
+        for ln in chunk:
+            ops.append(_pdf_string(ln) + b" Tj T*")
+        ops.append(b"ET")
+        stream = b"\n".join(ops)
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_no = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_no)
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for no, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % no + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+    return len(chunks)
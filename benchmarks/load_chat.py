@@ -0,0 +1,170 @@
+# benchmarks/load_chat.py
+"""Load test: latency of other endpoints while /api/chat traffic is running.
+
+    python -m benchmarks.load_chat                          # in-process, simulated LLM
+    python -m benchmarks.load_chat --blocking               # same, with a blocking LLM call (old behaviour)
+    python -m benchmarks.load_chat --base-url http://localhost:8000   # against a running server
+
+Probes PROBE_PATH (a cheap, Mongo-free endpoint) sequentially, first on an
+idle app and then while --chat-clients loops post chat questions, and
+prints probe latency percentiles for both phases. In-process mode serves
+the app over httpx.ASGITransport with a stub careplan and the OpenRouter
+API simulated at --llm-latency seconds per completion.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from typing import List, Optional
+
+import httpx
+
+PROBE_PATH = "/api/exercise/catalog/stats"
+CHAT_PATH = "/api/chat/"
+QUESTIONS = ["What should I eat for dinner?", "Why am I taking metformin?", "How much should I walk each day?"]
+STUB_CAREPLAN = {
+    "_id": "bench",
+    "patient_id": "1",
+    "medications": [{"id": "m1", "name": "Metformin", "dose": "500mg", "schedule": [{"time": "morning", "taken": None}]}],
+    "appointments": [{"id": "a1", "type": "Cardiology", "status": "pending"}],
+    "medical_history": "Type 2 diabetes.",
+}
+
+
+def _percentiles(samples: List[float]) -> dict:
+    if not samples:
+        return {"n": 0}
+    s = sorted(samples)
+    return {
+        "n": len(s),
+        "p50_ms": round(statistics.median(s) * 1e3, 2),
+        "p95_ms": round(s[min(len(s) - 1, int(len(s) * 0.95))] * 1e3, 2),
+        "max_ms": round(s[-1] * 1e3, 2),
+    }
+
+
+async def _probe_loop(client: httpx.AsyncClient, stop: asyncio.Event, interval: float) -> List[float]:
+    """Probe every `interval` seconds on a fixed schedule. Latency counts
+    from the scheduled send time, so time the event loop spent unable to
+    even start the probe is included."""
+    latencies = []
+    start = time.perf_counter()
+    k = 0
+    while not stop.is_set():
+        scheduled = start + k * interval
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        r = await client.get(PROBE_PATH)
+        latencies.append(time.perf_counter() - scheduled)
+        r.raise_for_status()
+        k += 1
+    return latencies
+
+
+async def _chat_loop(client: httpx.AsyncClient, stop: asyncio.Event, no: int, counts: dict) -> None:
+    i = no
+    while not stop.is_set():
+        r = await client.post(CHAT_PATH, json={"question": QUESTIONS[i % len(QUESTIONS)]}, timeout=60)
+        counts["ok" if r.status_code == 200 else "failed"] += 1
+        i += 1
+        # In-process requests may never suspend (ASGITransport); yield like a socket would
+        await asyncio.sleep(0)
+
+
+async def run(client: httpx.AsyncClient, duration: float, chat_clients: int, interval: float) -> dict:
+    stop = asyncio.Event()
+    idle_task = asyncio.ensure_future(_probe_loop(client, stop, interval))
+    await asyncio.sleep(duration)
+    stop.set()
+    idle = await idle_task
+
+    stop = asyncio.Event()
+    counts = {"ok": 0, "failed": 0}
+    chats = [asyncio.ensure_future(_chat_loop(client, stop, n, counts)) for n in range(chat_clients)]
+    await asyncio.sleep(0.2)  # let chat traffic ramp up
+    started = time.perf_counter()
+    probe_task = asyncio.ensure_future(_probe_loop(client, stop, interval))
+    await asyncio.sleep(duration)
+    stop.set()
+    loaded = await probe_task
+    await asyncio.gather(*chats, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    return {
+        "idle": _percentiles(idle),
+        "under_chat_load": _percentiles(loaded),
+        "chat_requests": counts,
+        "chat_rps": round((counts["ok"] + counts["failed"]) / elapsed, 2),
+        "load_phase_s": round(elapsed, 2),
+    }
+
+
+def _in_process_client(llm_latency: float, blocking: bool) -> httpx.AsyncClient:
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    from app.main import app
+    from app.service import careplan_context, crud_chat, instruction_parser
+    from app.utils import chat_client
+
+    async def stub_careplan():
+        return dict(STUB_CAREPLAN)
+
+    careplan_context._fetch_careplan = stub_careplan
+
+    # The transport must come from the httpx package the openai client is
+    # built on (newer releases ship their own fork of it).
+    openai_httpx = sys.modules[DefaultAsyncHttpxClient.__mro__[1].__module__.split(".")[0]]
+
+    async def openrouter(request):
+        await asyncio.sleep(llm_latency)
+        return openai_httpx.Response(200, json={
+            "id": "sim", "object": "chat.completion", "created": 0, "model": "sim",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": json.dumps({"action": "none"})}}],
+        })
+
+    chat_client._client = AsyncOpenAI(
+        base_url=chat_client.CHAT_API_BASE, api_key="sim",
+        http_client=DefaultAsyncHttpxClient(transport=openai_httpx.MockTransport(openrouter)),
+    )
+    chat_client._limit = asyncio.Semaphore(chat_client.CHAT_CONCURRENCY)
+
+    if blocking:
+        # What the chat flow did before: a synchronous completion inside the handler
+        async def blocking_completion(*args, **kwargs) -> str:
+            time.sleep(llm_latency)
+            return json.dumps({"action": "none"})
+
+        crud_chat.chat_completion = blocking_completion
+        instruction_parser.chat_completion = blocking_completion
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+
+async def main_async(args) -> dict:
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+    else:
+        client = _in_process_client(args.llm_latency, args.blocking)
+    async with client:
+        return await run(client, args.duration, args.chat_clients, args.probe_interval)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--base-url", help="target a running server instead of the in-process app")
+    ap.add_argument("--duration", type=float, default=5.0, help="seconds per phase")
+    ap.add_argument("--chat-clients", type=int, default=8, help="concurrent chat loops")
+    ap.add_argument("--probe-interval", type=float, default=0.05)
+    ap.add_argument("--llm-latency", type=float, default=1.0, help="simulated seconds per completion (in-process)")
+    ap.add_argument("--blocking", action="store_true", help="simulate the old blocking LLM client (in-process)")
+    args = ap.parse_args(argv)
+
+    result = asyncio.run(main_async(args))
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+import pytest
+
+from app.service.careplan_context import _build_appointment_index, _build_medication_index
+from app.service.intent_matcher import match_intent
+
+CAREPLAN = {
+    "medications": [
+        {"id": "m1", "name": "Metformin", "schedule": [{"time": "morning"}, {"time": "night"}]},
+        {"id": "m2", "name": "Lisinopril", "schedule": [{"time": "morning"}]},
+        {"id": "m3", "name": "Vitamin D3", "schedule": [{"time": "morning"}]},
+    ],
+    "appointments": [{"id": "a1", "type": "Cardiology"}, {"id": "a2", "type": "Dental Checkup"}],
+}
+MEDS = _build_medication_index(CAREPLAN)
+APPTS = _build_appointment_index(CAREPLAN)
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("I took metformin this morning",
+     {"action": "mark_medication", "medication_name": "metformin", "time": "morning", "taken": True}),
+    ("I didn't take metfromin tonight",
+     {"action": "mark_medication", "medication_name": "metformin", "time": "night", "taken": False}),
+    ("took my vitamin d3",
+     {"action": "mark_medication", "medication_name": "vitamin d3", "time": "morning", "taken": True}),
+    ("mark metformin as not taken this morning",
+     {"action": "mark_medication", "medication_name": "metformin", "time": "morning", "taken": False}),
+    ("confirm the cardiology appointment",
+     {"action": "update_appointment", "appointment_label": "cardiology", "status": "confirmed"}),
+    ("cancel my dental appointment",
+     {"action": "update_appointment", "appointment_label": "dental checkup", "status": "declined"}),
+    ("I skipped my metformin this morning",
+     {"action": "mark_medication", "medication_name": "metformin", "time": "morning", "taken": False}),
+    ("I took my morning dose of lisinopril",
+     {"action": "mark_medication", "medication_name": "lisinopril", "time": "morning", "taken": True}),
+    ("I can't make the cardiology appointment",
+     {"action": "update_appointment", "appointment_label": "cardiology", "status": "declined"}),
+])
+def test_commands_resolve_locally(question, expected):
+    assert match_intent(question, MEDS, APPTS) == expected
+
+
+@pytest.mark.parametrize("question", [
+    "I had a bad reaction to metformin this morning",
+    "Remind me to take metformin tonight",
+    "I need to take lisinopril",
+    "don't mark metformin as taken this morning",
+    "do not mark metformin as taken this morning",
+    "I forgot whether I took metformin this morning",
+    "I booked a taxi for the cardiology appointment",
+    "I took lisinopril but missed metformin",
+    "I took metformin",  # two scheduled slots, no time given
+    "Did I take metformin this morning?",
+    "confirm cardiology and cancel dental",
+    "I skipped breakfast but took my metformin",
+    "I missed my cardiology appointment but took metformin",
+    "Cancel the reminder about the cardiology appointment",
+    "cancel my ride to the cardiology appointment",
+])
+def test_non_commands_go_to_the_llm(question):
+    assert match_intent(question, MEDS, APPTS) is None